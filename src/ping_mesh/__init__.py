@@ -18,11 +18,29 @@ Ping Mesh - 网格化网络可达性测试工具
 __version__ = "1.2.0"
 __author__ = "sen"
 
-from .config_loader import ConfigLoader
-from .ping_tester import PingTester, PingResult
-from .ssh_client import SSHClient
-from .session_logger import SessionLogger
-from .pdf_report import generate_pdf_from_text
+import importlib
+
+# 按需导入：pandas / paramiko / reportlab 较重，只在首次访问对应名称时才导入，
+# 使 `ping-mesh --help` 等不需要它们的场景能够快速返回
+_LAZY_IMPORTS = {
+    "ConfigLoader": ".config_loader",
+    "PingTester": ".ping_tester",
+    "PingResult": ".ping_tester",
+    "SSHClient": ".ssh_client",
+    "SessionLogger": ".session_logger",
+    "generate_pdf_from_text": ".pdf_report",
+    "generate_pdf_from_lines": ".pdf_report",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "ConfigLoader",
@@ -31,5 +49,6 @@ __all__ = [
     "SSHClient",
     "SessionLogger",
     "generate_pdf_from_text",
+    "generate_pdf_from_lines",
 ]
 
@@ -8,12 +8,15 @@ import sys
 import os
 import signal
 import argparse
+from typing import TYPE_CHECKING
 
-from .config_loader import ConfigLoader
-from .ping_tester import PingTester
+# ConfigLoader / PingTester 依赖 pandas、paramiko 等较重的库，
+# 在 main() 中解析完参数后再导入，使 --help 能立即返回
+if TYPE_CHECKING:
+    from .ping_tester import PingTester
 
 # 全局引用，供信号处理器使用
-_tester: PingTester = None
+_tester: 'PingTester' = None
 _interrupted = False
 
 
@@ -34,7 +37,7 @@ def _signal_handler(signum, frame):
         _tester.stop_test()
 
 
-def _print_summary(tester: PingTester, was_interrupted: bool):
+def _print_summary(tester: 'PingTester', was_interrupted: bool):
     """打印测试结果摘要"""
     summary = tester.get_summary()
     
@@ -96,14 +99,14 @@ def main():
         '-n', '--max-concurrent',
         type=int,
         default=None,
-        help='最大并发 SSH 连接数 (默认: 根据任务数和系统资源自动计算)'
+        help='同时进行的最大 SSH 握手数 (默认: 根据服务器数和系统资源自动计算)'
     )
     
     parser.add_argument(
         '-i', '--interval',
         type=float,
         default=0.3,
-        help='连接发起间隔秒数 (默认: 0.3)'
+        help='超出并发数后相邻两次 SSH 握手的发起间隔秒数 (默认: 0.3)'
     )
     
     parser.add_argument(
@@ -119,8 +122,17 @@ def main():
         help='PDF 所有者密码（用于控制编辑权限，默认使用内置密码）'
     )
     
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='缓存配置解析结果，配置不变时跳过 Excel 解析（缓存包含明文密码）'
+    )
+    
     args = parser.parse_args()
     
+    from .config_loader import ConfigLoader
+    from .ping_tester import PingTester
+    
     # 注册信号处理器
     signal.signal(signal.SIGINT, _signal_handler)
     signal.signal(signal.SIGTERM, _signal_handler)
@@ -139,18 +151,14 @@ def main():
     try:
         # 加载配置
         print("正在加载配置文件...")
-        config_loader = ConfigLoader(args.config)
+        config_loader = ConfigLoader(args.config, use_cache=args.cache)
         servers = config_loader.load_config()
         
         if not config_loader.validate_config(servers):
             print("配置验证失败，程序退出")
             return 1
         
-        print(f"成功加载 {len(servers)} 台服务器配置")
-        
-        # 统计总的测试连接数
-        total_tests = sum(len(s['target_ips']) for s in servers)
-        print(f"将执行 {total_tests} 个 ping 测试\n")
+        print(f"成功加载 {len(servers)} 台服务器配置\n")
         
         # 显示服务器列表
         print("测试服务器列表:")
@@ -167,9 +175,12 @@ def main():
         )
         _tester = tester
         
+        # 统计总的测试连接数（按合并去重后的目标计算，与实际启动的 ping 数一致）
+        print(f"将执行 {tester.total_tasks} 个 ping 测试")
+        
         # 显示实际并发配置
         if args.max_concurrent is None:
-            print(f"并发连接: {tester.max_concurrent} (自动计算: 任务数 {total_tests}, 系统支持)")
+            print(f"并发连接: {tester.max_concurrent} (自动计算: SSH 连接数 {len(tester.server_groups)}, 系统支持)")
         else:
             print(f"并发连接: {tester.max_concurrent} (用户指定)")
         print()
@@ -5,21 +5,30 @@
 """
 
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
+import json
+import hashlib
+import re
+
+# 解析结果缓存目录（按配置文件内容哈希命名，重复运行同一配置时跳过 Excel 解析）
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ping-mesh")
+CACHE_FORMAT_VERSION = 1  # 解析逻辑或缓存格式变化时递增，旧缓存自动失效
 
 
 class ConfigLoader:
     """配置加载器"""
     
-    def __init__(self, excel_path: str):
+    def __init__(self, excel_path: str, use_cache: bool = False):
         """
         初始化配置加载器
         
         Args:
             excel_path: Excel 配置文件路径
+            use_cache: 是否使用解析结果缓存（缓存包含明文密码，默认关闭）
         """
         self.excel_path = excel_path
+        self.use_cache = use_cache
         
     def load_config(self) -> List[Dict]:
         """
@@ -35,8 +44,26 @@ class ConfigLoader:
         if not os.path.exists(self.excel_path):
             raise FileNotFoundError(f"配置文件不存在: {self.excel_path}")
         
-        # 读取 Excel
-        df = pd.read_excel(self.excel_path)
+        cache_file = self._get_cache_file() if self.use_cache else None
+        if cache_file:
+            servers = self._read_cache(cache_file)
+            if servers is not None:
+                return servers
+        
+        servers = self._parse_excel()
+        
+        if cache_file:
+            self._write_cache(cache_file, servers)
+        
+        return servers
+    
+    def _parse_excel(self) -> List[Dict]:
+        """解析 Excel 文件，返回服务器配置列表"""
+        # 读取 Excel（优先使用 Rust 实现的 calamine 引擎，未安装时回退到默认引擎）
+        try:
+            df = pd.read_excel(self.excel_path, engine='calamine')
+        except ImportError:
+            df = pd.read_excel(self.excel_path)
         
         # 验证必需列
         required_columns = ['ip']
@@ -44,27 +71,40 @@ class ConfigLoader:
             if col not in df.columns:
                 raise ValueError(f"配置文件缺少必需列: {col}")
         
+        # 按列一次性取出数组，避免 iterrows() 为每行构造 Series
+        row_count = len(df)
+        
+        def column(name: str) -> list:
+            if name in df.columns:
+                return df[name].tolist()
+            return [None] * row_count
+        
+        ip_col = column('ip')
+        user_col = column('user')
+        pass_col = column('pass')
+        dip_cols = [df[col].tolist() for col in ['dip1', 'dip2', 'dip3', 'dip4'] if col in df.columns]
+        
         servers = []
         
-        for _, row in df.iterrows():
+        for i in range(row_count):
             # 跳过空行
-            if pd.isna(row['ip']):
+            ip = ip_col[i]
+            if pd.isna(ip):
                 continue
-                
+            
             # 收集目标IP (dip1, dip2, dip3, dip4)
-            target_ips = []
-            for col in ['dip1', 'dip2', 'dip3', 'dip4']:
-                if col in df.columns and not pd.isna(row[col]):
-                    target_ips.append(str(row[col]))
+            target_ips = [str(dips[i]) for dips in dip_cols if not pd.isna(dips[i])]
             
             # 如果没有目标IP，跳过该服务器
             if not target_ips:
                 continue
             
+            user = user_col[i]
+            password = pass_col[i]
             server_config = {
-                'ip': str(row['ip']),
-                'user': str(row['user']) if 'user' in df.columns and not pd.isna(row['user']) else 'root',
-                'password': str(row['pass']) if 'pass' in df.columns and not pd.isna(row['pass']) else '',
+                'ip': str(ip),
+                'user': str(user) if not pd.isna(user) else 'root',
+                'password': str(password) if not pd.isna(password) else '',
                 'target_ips': target_ips
             }
             
@@ -72,6 +112,64 @@ class ConfigLoader:
         
         return servers
     
+    def _get_cache_file(self) -> str:
+        """根据缓存格式版本和配置文件内容的 SHA256 计算缓存文件路径"""
+        with open(self.excel_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        return os.path.join(CACHE_DIR, f"{self._cache_basename()}_v{CACHE_FORMAT_VERSION}_{digest}.json")
+    
+    def _cache_basename(self) -> str:
+        """
+        缓存文件名前缀（配置文件名去掉扩展名 + 绝对路径的短哈希）
+        
+        不同目录下的同名配置文件（如 siteA/servers.xlsx 和 siteB/servers.xlsx）前缀不同，
+        清理旧缓存时互不影响。
+        """
+        name = os.path.splitext(os.path.basename(self.excel_path))[0]
+        path_digest = hashlib.sha256(os.path.abspath(self.excel_path).encode('utf-8')).hexdigest()[:8]
+        return f"{name}_{path_digest}"
+    
+    def _read_cache(self, cache_file: str) -> Optional[List[Dict]]:
+        """读取缓存，缓存不存在或损坏时返回 None"""
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_cache(self, cache_file: str, servers: List[Dict]):
+        """写入缓存（包含明文密码，仅当前用户可读写）"""
+        try:
+            os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+            fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(servers, f, ensure_ascii=False)
+        except OSError:
+            return  # 缓存写入失败不影响正常加载
+        
+        self._prune_cache(cache_file)
+    
+    def _prune_cache(self, cache_file: str):
+        """删除同一配置文件的旧缓存（配置修改前的内容或旧的缓存格式）"""
+        name = os.path.splitext(os.path.basename(self.excel_path))[0]
+        pattern = re.compile(
+            rf"{re.escape(self._cache_basename())}_v\d+_[0-9a-f]{{64}}\.json"
+            # 不含路径哈希的旧命名，任何配置文件都不会再读取，一并删除
+            rf"|{re.escape(name)}_(v\d+_)?[0-9a-f]{{64}}\.json"
+        )
+        current = os.path.basename(cache_file)
+        try:
+            names = os.listdir(CACHE_DIR)
+        except OSError:
+            return
+        
+        for name in names:
+            if name != current and pattern.fullmatch(name):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except OSError:
+                    pass
+    
     def validate_config(self, servers: List[Dict]) -> bool:
         """
         验证配置有效性
@@ -6,7 +6,10 @@ PDF 报告生成模块
 内容与 TXT 报告完全一致，PDF 仅作为不可修改的"容器"。
 """
 
-import os
+import io
+import re
+import functools
+from typing import List
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.pdfgen.canvas import Canvas
@@ -18,8 +21,6 @@ from reportlab.lib.pdfencrypt import StandardEncryption
 # ---------------------------------------------------------------------------
 # 中文字体注册
 # ---------------------------------------------------------------------------
-_FONT_REGISTERED = False
-
 # 中文字体 + 等宽字体
 FONT_CN = 'STSong-Light'
 FONT_MONO = 'Courier'
@@ -36,25 +37,28 @@ TEXT_WIDTH = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
 TEXT_TOP = PAGE_HEIGHT - MARGIN_TOP
 TEXT_BOTTOM = MARGIN_BOTTOM
 
+# 页脚位置（居中）
+FOOTER_X = PAGE_WIDTH / 2
+FOOTER_Y = 10 * mm
+
 # 字体大小和行高
 FONT_SIZE = 9
 LINE_HEIGHT = 13  # 点
 
 
+@functools.lru_cache(maxsize=None)
 def _ensure_font():
-    """确保中文字体已注册（只注册一次）"""
-    global _FONT_REGISTERED
-    if not _FONT_REGISTERED:
-        pdfmetrics.registerFont(UnicodeCIDFont(FONT_CN))
-        _FONT_REGISTERED = True
+    """确保中文字体已注册（结果缓存，只构造并注册一次）"""
+    pdfmetrics.registerFont(UnicodeCIDFont(FONT_CN))
+
+
+# 中文字符（CJK 统一汉字 + CJK 标点）
+_CN_RE = re.compile('[\u4e00-\u9fff\u3000-\u303f]')
 
 
 def _has_chinese(text: str) -> bool:
     """检测文本是否包含中文字符"""
-    for ch in text:
-        if '\u4e00' <= ch <= '\u9fff' or '\u3000' <= ch <= '\u303f':
-            return True
-    return False
+    return _CN_RE.search(text) is not None
 
 
 def generate_pdf_from_text(
@@ -68,13 +72,35 @@ def generate_pdf_from_text(
     安全特性:
         - 无需密码即可打开查看和打印
         - 修改、复制、注释需要 owner 密码
-        - 128 位加密
+        - AES-256 加密（未安装 pikepdf 时回退为 128 位标准加密）
 
     Args:
         text:           报告的纯文本内容（与 TXT 报告完全一致）
         output_path:    输出 PDF 文件路径
         owner_password: PDF 所有者密码（控制编辑权限，默认 "batch_ping_admin"）
 
+    Returns:
+        生成的 PDF 文件路径
+    """
+    return generate_pdf_from_lines(text.splitlines(), output_path, owner_password)
+
+
+def generate_pdf_from_lines(
+    lines: List[str],
+    output_path: str,
+    owner_password: str = None,
+) -> str:
+    """
+    将按行拆分好的报告内容渲染为加密保护的 PDF 文件
+
+    与 generate_pdf_from_text 相同，但直接接收文本行，
+    调用方已有行列表时无需先拼接再拆分。
+
+    Args:
+        lines:          报告文本行（不含换行符）
+        output_path:    输出 PDF 文件路径
+        owner_password: PDF 所有者密码（控制编辑权限，默认 "batch_ping_admin"）
+
     Returns:
         生成的 PDF 文件路径
     """
@@ -83,19 +109,32 @@ def generate_pdf_from_text(
     if owner_password is None:
         owner_password = "batch_ping_admin"
 
-    # PDF 加密配置 — 允许查看+打印，禁止修改+复制+注释
-    encryption = StandardEncryption(
-        userPassword='',
-        ownerPassword=owner_password,
-        canPrint=1,
-        canModify=0,
-        canCopy=0,
-        canAnnotate=0,
-        strength=128,
-    )
+    # 优先由 pikepdf（qpdf，C++ 实现）在渲染后统一做 AES-256 加密；
+    # 未安装时回退到 reportlab 内置的纯 Python 128 位加密
+    try:
+        import pikepdf
+    except ImportError:
+        pikepdf = None
+
+    if pikepdf is None:
+        # PDF 加密配置 — 允许查看+打印，禁止修改+复制+注释
+        encryption = StandardEncryption(
+            userPassword='',
+            ownerPassword=owner_password,
+            canPrint=1,
+            canModify=0,
+            canCopy=0,
+            canAnnotate=0,
+            strength=128,
+        )
+        target = output_path
+    else:
+        # 先渲染到内存，加密后再落盘，磁盘上不出现未加密的中间文件
+        encryption = None
+        target = io.BytesIO()
 
     c = Canvas(
-        output_path,
+        target,
         pagesize=A4,
         encrypt=encryption,
     )
@@ -104,41 +143,61 @@ def generate_pdf_from_text(
     c.setSubject("网络故障演练测试报告")
     c.setCreator("Batch Ping Tester v1.2.0")
 
-    # 按行渲染文本
-    lines = text.splitlines()
-    y = TEXT_TOP  # 当前绘制 y 坐标
+    # 按页渲染：每页只用一个文本对象逐行输出，仅在字体变化时切换字体
+    # （含中文用宋体，纯 ASCII 用等宽），避免每行单独生成字体和定位指令
+    lines_per_page = int((TEXT_TOP - TEXT_BOTTOM) // LINE_HEIGHT)
     page_num = 1
 
-    _draw_footer(c, page_num)
-
-    for line in lines:
-        # 如果当前行放不下，换页
-        if y - LINE_HEIGHT < TEXT_BOTTOM:
+    for start in range(0, max(len(lines), 1), lines_per_page):
+        if page_num > 1:
             c.showPage()
-            page_num += 1
-            y = TEXT_TOP
-            _draw_footer(c, page_num)
+        _draw_footer(c, page_num)
 
-        # 根据内容选择字体（含中文用宋体，纯 ASCII 用等宽）
-        if _has_chinese(line):
-            c.setFont(FONT_CN, FONT_SIZE)
-        else:
-            c.setFont(FONT_MONO, FONT_SIZE)
+        text = c.beginText(MARGIN_LEFT, TEXT_TOP)
+        current_font = None
+        for line in lines[start:start + lines_per_page]:
+            font = FONT_CN if _has_chinese(line) else FONT_MONO
+            if font != current_font:
+                text.setFont(font, FONT_SIZE, LINE_HEIGHT)
+                current_font = font
+            text.textLine(line)
+        c.drawText(text)
 
-        # 绘制文本行（截断超长行以防溢出）
-        c.drawString(MARGIN_LEFT, y, line)
-        y -= LINE_HEIGHT
+        page_num += 1
 
     c.save()
+
+    if pikepdf is not None:
+        _encrypt_with_pikepdf(pikepdf, target, output_path, owner_password)
+
     return output_path
 
 
+def _encrypt_with_pikepdf(pikepdf, pdf_data: io.BytesIO, output_path: str, owner_password: str):
+    """用 pikepdf 加密内存中的 PDF 并写入文件（权限与 StandardEncryption 配置一致）"""
+    pdf_data.seek(0)
+    permissions = pikepdf.Permissions(
+        extract=False,
+        modify_annotation=False,
+        modify_assembly=False,
+        modify_form=False,
+        modify_other=False,
+        print_lowres=True,
+        print_highres=True,
+    )
+    with pikepdf.open(pdf_data) as pdf:
+        pdf.save(
+            output_path,
+            encryption=pikepdf.Encryption(owner=owner_password, user='', R=6, allow=permissions),
+        )
+
+
 def _draw_footer(c: Canvas, page_num: int):
     """在当前页绘制页脚（页码 + 保护声明）"""
     c.setFont(FONT_CN, 7)
     c.setFillGray(0.6)
     c.drawCentredString(
-        PAGE_WIDTH / 2, 10 * mm,
+        FOOTER_X, FOOTER_Y,
         f"- {page_num} -    本报告由 Batch Ping Tester 自动生成 | 文档受密码保护，禁止修改",
     )
     c.setFillGray(0)  # 恢复黑色
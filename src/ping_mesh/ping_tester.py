@@ -5,12 +5,15 @@ Ping 测试模块
 """
 
 import threading
-from datetime import datetime, timedelta
+import queue
+import sys
+from datetime import datetime
 from typing import List, Dict, Optional
 import os
 import time
 import resource
 import re
+from collections import deque
 from .ssh_client import SSHClient
 from .session_logger import SessionLogger
 
@@ -42,66 +45,186 @@ def get_system_max_connections() -> int:
         return 20
 
 
+# 时间戳格式化缓存：(分钟序号, "YYYY-MM-DD HH:MM:" 前缀)
+# 同一分钟内的时间戳只需拼接秒数，strftime 每分钟最多调用一次
+_minute_prefix_cache = (None, "")
+
+
+def format_timestamp(epoch_seconds: int) -> str:
+    """
+    将 Unix 时间（秒）格式化为 "%Y-%m-%d %H:%M:%S"
+    
+    Args:
+        epoch_seconds: Unix 时间戳（整数秒）
+        
+    Returns:
+        本地时间字符串
+    """
+    global _minute_prefix_cache
+    minute, second = divmod(epoch_seconds, 60)
+    cached_minute, prefix = _minute_prefix_cache
+    if cached_minute != minute:
+        prefix = time.strftime("%Y-%m-%d %H:%M:", time.localtime(minute * 60))
+        _minute_prefix_cache = (minute, prefix)  # 整体替换元组，多线程下无需加锁
+    return f"{prefix}{second:02d}"
+
+
+def format_datetime(dt: datetime) -> str:
+    """
+    将 datetime 格式化为 "%Y-%m-%d %H:%M:%S"（固定格式，直接拼接各字段，不经过 strftime）
+    
+    Args:
+        dt: 时间
+        
+    Returns:
+        时间字符串
+    """
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+
+
+# ping 输出中的序号，支持格式:
+# - "64 bytes from 223.5.5.5: icmp_seq=123 ttl=117 time=20.1 ms"
+# - "no answer yet for icmp_seq=123"
+_ICMP_SEQ_RE = re.compile(r'icmp_seq[=:](\d+)')
+
+
+# ping 输出行分类
+LINE_OTHER = 0  # 其他输出（统计信息、提示等）
+LINE_REPLY = 1  # ping 响应
+LINE_LOSS = 2   # 丢包
+
+
+def classify_line(line: str) -> int:
+    """
+    判断 ping 输出行的类型（每行只分类一次，结果由 PingResult.add_output 返回给回调复用）
+    
+    ping 的输出大小写固定（"no answer yet" / "Request timeout"），
+    直接匹配两种写法，避免每行调用 line.lower() 分配新字符串。
+    
+    Returns:
+        LINE_REPLY / LINE_LOSS / LINE_OTHER
+    """
+    if 'bytes from' in line:
+        return LINE_REPLY
+    if 'no answer yet' in line or 'timeout' in line or 'Timeout' in line:
+        return LINE_LOSS
+    return LINE_OTHER
+
+
+def group_servers_by_ip(servers: List[Dict]) -> List[Dict]:
+    """
+    按服务器IP和登录信息合并配置（同一服务器多行时合并目标IP并去重）
+    
+    同一IP但用户名或密码不同的行各自建立 SSH 连接，不会丢弃任何一行的登录信息。
+    
+    Args:
+        servers: 服务器配置列表
+        
+    Returns:
+        每个 (IP, 用户名, 密码) 一项的配置列表（保持原始顺序）
+    """
+    groups = {}
+    for server in servers:
+        key = (server['ip'], server['user'], server['password'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = dict(server, target_ips=[])
+        for target_ip in server['target_ips']:
+            if target_ip not in group['target_ips']:
+                group['target_ips'].append(target_ip)
+    return list(groups.values())
+
+
+def split_server_groups(groups: List[Dict], max_targets: int) -> List[Dict]:
+    """
+    将目标IP过多的服务器拆分为多项，每项对应一个 SSH 连接
+    
+    同一连接上每个目标占用一个会话通道，而 sshd 限制了单个连接的会话数
+    （OpenSSH 默认 MaxSessions 10），超出的通道无法打开。
+    
+    Args:
+        groups: group_servers_by_ip 返回的配置列表
+        max_targets: 每个连接的最大目标数
+        
+    Returns:
+        每项最多 max_targets 个目标IP的配置列表（保持原始顺序）
+    """
+    connections = []
+    for group in groups:
+        targets = group['target_ips']
+        for start in range(0, len(targets), max_targets):
+            connections.append(dict(group, target_ips=targets[start:start + max_targets]))
+    return connections
+
+
 class PingResult:
     """Ping 结果记录"""
     
+    # 内存中只保留最近的输出（完整输出见会话日志文件），长时间测试内存占用保持恒定
+    OUTPUT_TAIL_LINES = 50  # 报告中展示的最近输出行数
+    MAX_LOSS_LINES = 10000  # 保留的丢包记录上限
+    
     def __init__(self, server_ip: str, server_hostname: str, target_ip: str, log_file: str = None):
         self.server_ip = server_ip
         self.server_hostname = server_hostname
         self.target_ip = target_ip
         self.start_time = datetime.now()
+        self.start_epoch = int(self.start_time.timestamp())  # 开始时间（整数秒），用于快速计算包时间
         self.end_time = None
-        self.output_lines = []
-        self.packet_loss_lines = []  # 记录丢包的行
+        # 缓冲区保存 (时间戳秒, 原始行)，带时间戳的文本只在生成报告时格式化
+        self.output_tail = deque(maxlen=self.OUTPUT_TAIL_LINES)  # 最近的输出行
+        self.output_line_count = 0  # 输出总行数（含已滚出缓冲区的行）
+        self.loss_tail = deque(maxlen=self.MAX_LOSS_LINES)  # 记录丢包的行
         self.total_packets = 0
         self.lost_packets = 0
         self.consecutive_losses = 0  # 连续丢包计数
         self.log_file = log_file  # 独立的会话日志文件路径
         
-    def _extract_icmp_seq(self, line: str) -> Optional[int]:
-        """
-        从 ping 输出中提取 icmp_seq 序号
-        
-        支持格式:
-        - "64 bytes from 223.5.5.5: icmp_seq=123 ttl=117 time=20.1 ms"
-        - "no answer yet for icmp_seq=123"
-        """
-        match = re.search(r'icmp_seq[=:](\d+)', line)
-        if match:
-            return int(match.group(1))
-        return None
+    @property
+    def output_lines(self) -> List[str]:
+        """最近的输出行（带时间戳）"""
+        # ping 线程可能仍在追加，先整体复制（C 层单次调用，持有 GIL 期间完成）再格式化，
+        # 避免遍历期间 deque 被修改抛出 RuntimeError
+        entries = tuple(self.output_tail)
+        return [f"[{format_timestamp(ts)}] {line}" for ts, line in entries]
+    
+    @property
+    def packet_loss_lines(self) -> List[str]:
+        """记录的丢包行（带时间戳）"""
+        # 同 output_lines，先复制快照再格式化
+        entries = tuple(self.loss_tail)
+        return [f"[{format_timestamp(ts)}] {line}" for ts, line in entries]
     
-    def _calculate_timestamp(self, icmp_seq: Optional[int]) -> str:
+    def add_output(self, line: str) -> int:
         """
-        根据 icmp_seq 计算实际的 ping 时间
+        添加输出行
         
-        ping 每秒发送一个包，icmp_seq=1 对应测试开始时间
+        Returns:
+            行类型（LINE_REPLY / LINE_LOSS / LINE_OTHER）
         """
-        if icmp_seq is not None and icmp_seq > 0:
-            # icmp_seq=1 对应 start_time，每增加 1 就加 1 秒
-            actual_time = self.start_time + timedelta(seconds=icmp_seq - 1)
-            return actual_time.strftime("%Y-%m-%d %H:%M:%S")
+        # 根据 icmp_seq 计算实际时间（格式化推迟到生成报告时）
+        # ping 每秒发送一个包，icmp_seq=1 对应 start_time，每增加 1 就加 1 秒
+        match = _ICMP_SEQ_RE.search(line)
+        icmp_seq = int(match.group(1)) if match else 0
+        if icmp_seq > 0:
+            timestamp = self.start_epoch + icmp_seq - 1
         else:
-            # 无法提取序号时使用当前时间
-            return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    def add_output(self, line: str):
-        """添加输出行"""
-        # 尝试从 ping 输出中提取 icmp_seq，计算实际时间
-        icmp_seq = self._extract_icmp_seq(line)
-        timestamp = self._calculate_timestamp(icmp_seq)
-        formatted_line = f"[{timestamp}] {line}"
-        self.output_lines.append(formatted_line)
+            timestamp = int(time.time())  # 无法提取序号时使用当前时间
+        entry = (timestamp, line)
+        self.output_tail.append(entry)
+        self.output_line_count += 1
         
         # 检测是否是 ping 响应或丢包
-        if 'bytes from' in line:
+        kind = classify_line(line)
+        if kind == LINE_REPLY:
             self.total_packets += 1
             self.consecutive_losses = 0  # 重置连续丢包计数
-        elif 'no answer yet' in line or 'timeout' in line.lower():
+        elif kind == LINE_LOSS:
             self.lost_packets += 1
             self.total_packets += 1
             self.consecutive_losses += 1
-            self.packet_loss_lines.append(formatted_line)
+            self.loss_tail.append(entry)
+        return kind
     
     def finish(self):
         """结束测试"""
@@ -120,6 +243,9 @@ class PingTester:
     # 默认并发配置
     DEFAULT_CONNECTION_INTERVAL = 0.3  # 连接间隔（秒）
     MAX_CONCURRENT_LIMIT = 50  # 并发连接数硬上限（避免服务器拒绝）
+    MAX_CHANNELS_PER_CONNECTION = 8  # 单个 SSH 连接上的最大 ping 通道数（低于 sshd 默认 MaxSessions 10）
+    WORKER_STACK_SIZE = 1024 * 1024  # 测试线程栈大小（默认 8MB，测试线程只做 I/O，1MB 足够）
+    CONSOLE_BATCH_SIZE = 32  # 控制台输出线程单次合并写入的最大消息数
     
     def __init__(self, servers: List[Dict], output_dir: str, 
                  max_concurrent: int = None, connection_interval: float = None):
@@ -129,8 +255,8 @@ class PingTester:
         Args:
             servers: 服务器配置列表
             output_dir: 输出目录
-            max_concurrent: 最大并发连接数（默认根据任务数和系统资源动态计算）
-            connection_interval: 连接间隔秒数（默认 0.3）
+            max_concurrent: 同时进行的最大 SSH 握手数（默认根据服务器数和系统资源动态计算）
+            connection_interval: 超出并发数后相邻两次 SSH 握手的发起间隔秒数（默认 0.3）
         """
         self.servers = servers
         self.output_dir = output_dir
@@ -140,14 +266,21 @@ class PingTester:
         self.lock = threading.Lock()
         self.running = False
         
-        # 计算总任务数
-        self.total_tasks = sum(len(server['target_ips']) for server in servers)
+        # 测试线程的控制台消息统一交给一个输出线程批量写入，避免各线程争用 stdout
+        self.console_queue = queue.Queue()
+        self.console_thread = None
+        
+        # 按服务器分组，同一台服务器的目标共享 SSH 连接（每个连接最多 MAX_CHANNELS_PER_CONNECTION 个目标）
+        self.server_groups = split_server_groups(group_servers_by_ip(servers), self.MAX_CHANNELS_PER_CONNECTION)
+        
+        # 计算总任务数（按合并去重后的目标计算，与实际启动的 ping 数一致）
+        self.total_tasks = sum(len(server['target_ips']) for server in self.server_groups)
         
         # 动态计算默认并发数
         if max_concurrent is None:
             system_max = get_system_max_connections()
-            # 取任务数和系统支持数的较小值
-            self.max_concurrent = min(self.total_tasks, system_max, self.MAX_CONCURRENT_LIMIT)
+            # 取连接数（服务器数）和系统支持数的较小值
+            self.max_concurrent = min(len(self.server_groups), system_max, self.MAX_CONCURRENT_LIMIT)
             # 确保至少为 1
             self.max_concurrent = max(1, self.max_concurrent)
         else:
@@ -155,8 +288,17 @@ class PingTester:
         
         self.connection_interval = connection_interval or self.DEFAULT_CONNECTION_INTERVAL
         
-        # 使用信号量限制并发 SSH 连接数
-        self.connection_semaphore = threading.Semaphore(self.max_concurrent)
+        # SSH 握手线程（线程数即同时进行的最大握手数），连接建立后 ping 在独立线程中运行
+        self.connect_queue = queue.Queue()  # 待握手的服务器
+        self.connect_threads = []
+        self.connecting_clients = set()  # 正在握手的 SSH 客户端（停止时中断其重试）
+        self.active_connect_workers = 0  # 尚未退出的握手线程数（归零时恢复线程栈大小）
+        self.previous_stack_size = 0
+        self.client_refs = {}  # SSH 客户端 -> 仍在使用该连接的 ping 线程数
+        
+        # 握手发起间隔控制（下一次握手最早可以发起的时间）
+        self.connect_pacing_lock = threading.Lock()
+        self.next_connect_time = 0.0  # 令牌桶的理论到达时间（monotonic 秒）
         
         # 为本次测试创建带时间戳的会话目录
         self.session_dir = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -170,124 +312,281 @@ class PingTester:
         self.running = True
         print(f"\n{'='*80}")
         print(f"开始批量 Ping 测试")
-        print(f"测试时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"测试时间: {format_datetime(datetime.now())}")
         print(f"测试服务器数量: {len(self.servers)} 台")
         print(f"{'='*80}\n")
         
-        # 计算总任务数
-        total_tasks = sum(len(server['target_ips']) for server in self.servers)
-        print(f"正在启动 {total_tasks} 个测试任务...")
-        print(f"并发限制: 最多 {self.max_concurrent} 个同时连接")
+        print(f"正在启动 {self.total_tasks} 个测试任务（{len(self.server_groups)} 个 SSH 连接）...")
+        print(f"并发限制: 最多 {self.max_concurrent} 个同时握手")
         print(f"连接间隔: {self.connection_interval} 秒")
         print("按 Ctrl+C 可随时停止\n")
         
-        # 为每个服务器的每个目标IP创建一个线程
-        for server in self.servers:
-            for target_ip in server['target_ips']:
-                thread = threading.Thread(
-                    target=self._run_ping_test,
-                    args=(server, target_ip),
-                    daemon=True
-                )
-                thread.start()
-                self.threads.append(thread)
+        self.console_thread = threading.Thread(target=self._console_writer, daemon=True)
+        self.console_thread.start()
+        
+        # 测试线程只做 I/O，缩小线程栈以降低大量目标时的内存占用。
+        # 该设置是进程级的，而 ping 线程由握手线程陆续创建，
+        # 因此在最后一个握手线程退出时（此后不再创建测试线程）恢复原值
+        self.previous_stack_size = threading.stack_size(self.WORKER_STACK_SIZE)
+        
+        # 所有服务器一次性放入握手队列，由 max_concurrent 个握手线程依次取出连接；
+        # 每台服务器连接一次后为每个目标IP开启独立的 ping 通道。
+        # 握手线程为守护线程，停止后仍卡在 SSH 握手中的线程不会阻止进程退出
+        for server in self.server_groups:
+            self.connect_queue.put(server)
+        
+        worker_count = min(self.max_concurrent, len(self.server_groups))
+        self.active_connect_workers = worker_count
+        if worker_count == 0:
+            threading.stack_size(self.previous_stack_size)
+        
+        for index in range(worker_count):
+            thread = threading.Thread(
+                target=self._connect_worker,
+                name=f"ssh-connect_{index}",
+                daemon=True
+            )
+            thread.start()
+            self.connect_threads.append(thread)
+    
+    def _emit(self, message: str):
+        """从测试线程输出一条控制台消息（由输出线程批量写入）"""
+        self.console_queue.put(message)
+    
+    def _console_writer(self):
+        """控制台输出线程 - 合并积压的消息，一次写入 stdout"""
+        while True:
+            messages = [self.console_queue.get()]
+            while len(messages) < self.CONSOLE_BATCH_SIZE:
+                try:
+                    messages.append(self.console_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                sys.stdout.write(''.join(f"{message}\n" for message in messages))
+                sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # stdout 已关闭（如管道断开），丢弃消息但继续消费队列
+            finally:
+                # 无论写入是否成功都要标记完成，否则 _flush_console 会永久阻塞
+                for _ in messages:
+                    self.console_queue.task_done()
+    
+    def _flush_console(self):
+        """等待已提交的控制台消息全部输出"""
+        if self.console_thread is not None:
+            self.console_queue.join()
+    
+    def _connect_worker(self):
+        """握手线程 - 依次取出待连接的服务器，测试停止后丢弃队列中剩余的服务器"""
+        try:
+            while self.running:
+                try:
+                    server = self.connect_queue.get_nowait()
+                except queue.Empty:
+                    return
+                
+                self._start_server(server)
+        finally:
+            with self.lock:
+                self.active_connect_workers -= 1
+                if self.active_connect_workers == 0:
+                    threading.stack_size(self.previous_stack_size)
+    
+    def _start_server(self, server: Dict):
+        """
+        连接一台服务器并为其每个目标IP启动 ping 线程（在握手线程中执行）
+        
+        Args:
+            server: 服务器配置
+        """
+        ssh_client = self._connect(server)
+        if ssh_client is None:
+            return
+        
+        try:
+            hostname = ssh_client.get_hostname()
+            
+            with self.lock:
+                # 连接期间测试已被停止，不再启动 ping
+                if not self.running:
+                    self._close_client(ssh_client)
+                    return
+                
+                # 将 SSH 客户端添加到列表（用于停止时统一管理）
+                self.ssh_clients.append(ssh_client)
+                self.client_refs[ssh_client] = len(server['target_ips'])
                 
-                # 连接间隔，避免同时建立太多 SSH 连接
-                time.sleep(self.connection_interval)
+                # 每个目标IP一个 ping 线程，复用同一个 SSH 连接
+                for target_ip in server['target_ips']:
+                    thread = threading.Thread(
+                        target=self._run_ping_test,
+                        args=(ssh_client, server, hostname, target_ip),
+                        daemon=True
+                    )
+                    thread.start()
+                    self.threads.append(thread)
+        except Exception as e:
+            self._emit(f"✗ 测试出错: {server['ip']}: {str(e)}")
+            self._close_client(ssh_client)
+    
+    def _connect(self, server: Dict) -> Optional[SSHClient]:
+        """
+        建立到服务器的 SSH 连接（带重试机制）
+        
+        Args:
+            server: 服务器配置
+            
+        Returns:
+            已连接的 SSH 客户端，连接失败或测试已停止时返回 None
+        """
+        if not self.running:
+            return None
+        
+        ssh_client = SSHClient(
+            host=server['ip'],
+            username=server['user'],
+            password=server['password']
+        )
+        
+        self._wait_connection_interval()
+        
+        with self.lock:
+            # 等待发起间隔期间测试已被停止
+            if not self.running:
+                return None
+            self.connecting_clients.add(ssh_client)
+        
+        try:
+            connected = ssh_client.connect()
+        finally:
+            with self.lock:
+                self.connecting_clients.discard(ssh_client)
+        
+        if not connected:
+            # 停止后中断的握手不再报告连接失败
+            if self.running:
+                self._emit(f"✗ 无法连接到服务器 {server['ip']}: {ssh_client.last_error}")
+            return None
+        
+        return ssh_client
+    
+    def _release_client(self, ssh_client: SSHClient):
+        """ping 线程结束时调用，同一连接上最后一个 ping 结束后关闭 SSH 连接"""
+        with self.lock:
+            self.client_refs[ssh_client] -= 1
+            last_user = self.client_refs[ssh_client] == 0
+        
+        if last_user:
+            self._close_client(ssh_client)
+    
+    def _close_client(self, ssh_client: SSHClient):
+        """关闭 SSH 连接，失败原因交给控制台输出线程"""
+        error = ssh_client.close()
+        if error:
+            self._emit(f"✗ {error}")
     
-    def _run_ping_test(self, server: Dict, target_ip: str):
+    def _wait_connection_interval(self):
+        """
+        控制 SSH 握手的发起速率（令牌桶）
+        
+        前 max_concurrent 个握手立即发起，之后平均每 connection_interval 秒发起一个，
+        服务器数不超过并发数时启动无需等待。
+        """
+        with self.connect_pacing_lock:
+            now = time.monotonic()
+            self.next_connect_time = max(self.next_connect_time, now)
+            burst_allowance = (self.max_concurrent - 1) * self.connection_interval
+            wait_time = self.next_connect_time - burst_allowance - now
+            if wait_time > 0:
+                time.sleep(wait_time)
+            self.next_connect_time += self.connection_interval
+    
+    def _run_ping_test(self, ssh_client: SSHClient, server: Dict, hostname: str, target_ip: str):
         """
         运行单个 ping 测试
         
         Args:
+            ssh_client: 已连接的 SSH 客户端（同一服务器的所有目标共享）
             server: 服务器配置
+            hostname: 服务器主机名
             target_ip: 目标IP
         """
-        ssh_client = None
         result = None
         session_logger = None
         
-        # 使用信号量限制并发 SSH 连接数
-        with self.connection_semaphore:
+        try:
+            # 通道打开失败（如超出 sshd 的 MaxSessions）时该目标计为连接失败，不生成结果
             try:
-                # 连接服务器（带重试机制）
-                ssh_client = SSHClient(
-                    host=server['ip'],
-                    username=server['user'],
-                    password=server['password']
-                )
-                
-                if not ssh_client.connect():
-                    print(f"✗ 无法连接到服务器 {server['ip']}")
-                    return
-                
-                # 将 SSH 客户端添加到列表（用于停止时统一管理）
-                with self.lock:
-                    self.ssh_clients.append(ssh_client)
-                
-                hostname = ssh_client.get_hostname()
-                print(f"✓ 已连接: {server['ip']} ({hostname}) -> 开始 ping {target_ip}")
-                
-                # 创建会话日志记录器（独立的终端日志文件）
-                session_logger = SessionLogger(self.output_dir, self.session_dir, server['ip'], hostname, target_ip)
-                
-                # 创建结果记录
-                result = PingResult(server['ip'], hostname, target_ip, session_logger.get_log_file())
-                
-                with self.lock:
-                    self.results.append(result)
-                
-                # 定义输出回调
-                def output_callback(line: str):
-                    # 记录到内存
-                    result.add_output(line)
-                    
-                    # 记录到独立的会话日志文件
-                    if 'no answer yet' in line or 'timeout' in line.lower():
-                        session_logger.log_loss(line)  # 丢包用特殊标记
-                    else:
-                        session_logger.log(line)  # 正常记录
-                    
-                    # 控制台智能显示（首次、每10次、恢复时）
-                    if 'no answer yet' in line or 'timeout' in line.lower():
-                        # 首次丢包或每10次丢包显示一次
-                        if result.consecutive_losses == 1:
-                            print(f"⚠ 丢包检测: {server['ip']}({hostname}) -> {target_ip}: 开始丢包")
-                        elif result.consecutive_losses % 10 == 0:
-                            print(f"⚠ 丢包检测: {server['ip']}({hostname}) -> {target_ip}: 已连续丢包 {result.consecutive_losses} 个")
-                    elif result.consecutive_losses > 0 and 'bytes from' in line:
-                        # 只有真正的 ping 响应才算恢复（避免统计信息误判）
-                        print(f"✓ 恢复正常: {server['ip']}({hostname}) -> {target_ip}: 共丢失 {result.consecutive_losses} 个包后恢复")
+                channel = ssh_client.open_ping_channel(target_ip)
+            except Exception as e:
+                self._emit(f"✗ 无法启动 ping: {server['ip']} -> {target_ip}: {str(e)}")
+                return
+            
+            self._emit(f"✓ 已连接: {server['ip']} ({hostname}) -> 开始 ping {target_ip}")
+            
+            # 创建会话日志记录器（独立的终端日志文件）
+            session_logger = SessionLogger(self.output_dir, self.session_dir, server['ip'], hostname, target_ip)
+            
+            # 创建结果记录
+            result = PingResult(server['ip'], hostname, target_ip, session_logger.get_log_file())
+            
+            with self.lock:
+                self.results.append(result)
+            
+            # 定义输出回调
+            def output_callback(line: str):
+                # 记录到内存（响应会清零连续丢包计数，恢复提示需要清零前的值）
+                previous_losses = result.consecutive_losses
+                kind = result.add_output(line)
+                is_loss = kind == LINE_LOSS
                 
-                # 执行 ping
-                ssh_client.execute_ping(target_ip, callback=output_callback)
+                # 记录到独立的会话日志文件
+                if is_loss:
+                    session_logger.log_loss(line)  # 丢包用特殊标记
+                else:
+                    session_logger.log(line)  # 正常记录
                 
-            except Exception as e:
-                error_msg = f"测试出错: {server['ip']} -> {target_ip}: {str(e)}"
-                print(f"✗ {error_msg}")
-                if result:
-                    result.add_output(error_msg)
-                if session_logger:
-                    session_logger.log(error_msg)
-            finally:
-                # 确保结果被标记为完成
-                if result and result.end_time is None:
-                    result.finish()
-                # 关闭会话日志
-                if session_logger:
-                    session_logger.close()
-                # 关闭 SSH 连接（stop_ping 已在 stop_test 中统一调用）
-                if ssh_client:
-                    ssh_client.close()
+                # 控制台智能显示（首次、每10次、恢复时）
+                if is_loss:
+                    # 首次丢包或每10次丢包显示一次
+                    if result.consecutive_losses == 1:
+                        self._emit(f"⚠ 丢包检测: {server['ip']}({hostname}) -> {target_ip}: 开始丢包")
+                    elif result.consecutive_losses % 10 == 0:
+                        self._emit(f"⚠ 丢包检测: {server['ip']}({hostname}) -> {target_ip}: 已连续丢包 {result.consecutive_losses} 个")
+                elif kind == LINE_REPLY and previous_losses > 0:
+                    # 只有真正的 ping 响应才算恢复（避免统计信息误判）
+                    self._emit(f"✓ 恢复正常: {server['ip']}({hostname}) -> {target_ip}: 共丢失 {previous_losses} 个包后恢复")
+            
+            # 读取 ping 输出直到停止
+            ssh_client.read_ping_output(channel, callback=output_callback)
+            
+        except Exception as e:
+            error_msg = f"测试出错: {server['ip']} -> {target_ip}: {str(e)}"
+            self._emit(f"✗ {error_msg}")
+            if result:
+                result.add_output(error_msg)
+            if session_logger:
+                session_logger.log(error_msg)
+        finally:
+            # 确保结果被标记为完成
+            if result and result.end_time is None:
+                result.finish()
+            # 关闭会话日志
+            if session_logger:
+                session_logger.close()
+            # 关闭 SSH 连接（stop_ping 已在 stop_test 中统一调用）
+            self._release_client(ssh_client)
     
     def stop_test(self):
         """停止所有测试 - 主动停止所有 SSH ping 并等待线程"""
         self.running = False
         print("\n正在停止所有测试...")
         
-        # 1. 主动停止所有 SSH 客户端的 ping（发送 Ctrl+C）
+        # 1. 主动停止所有 SSH 客户端的 ping（发送 Ctrl+C），并中断正在进行的握手重试
         with self.lock:
-            for ssh_client in self.ssh_clients:
+            for ssh_client in self.ssh_clients + list(self.connecting_clients):
                 try:
                     ssh_client.stop_ping()
                 except:
@@ -297,49 +596,51 @@ class PingTester:
             for result in self.results:
                 if result.end_time is None:
                     result.finish()
+            
+            threads = list(self.threads)
         
-        # 2. 并行等待所有线程结束（总超时5秒，已主动停止 ping）
-        start_time = time.time()
-        timeout = 5  # 从8秒减少到5秒（因为已主动停止）
-        total_threads = len(self.threads)
-        last_alive_count = total_threads
+        # 2. 等待所有线程结束（共用 5 秒截止时间，已主动停止 ping，逐个 join 阻塞等待而非轮询）
+        deadline = time.monotonic() + 5
+        total_threads = len(threads)
+        stopped_count = 0
         
-        while time.time() - start_time < timeout:
-            # 检查还有多少线程在运行
-            alive_threads = [t for t in self.threads if t.is_alive()]
-            alive_count = len(alive_threads)
-            
-            if alive_count == 0:
-                # 所有线程都已停止
+        for thread in threads:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 break
-            
-            # 显示进度（当数量变化时更新）
-            if alive_count != last_alive_count:
-                stopped_count = total_threads - alive_count
+            thread.join(timeout=remaining)
+            # join 超时返回时线程仍在运行，不计入已停止
+            if not thread.is_alive():
+                stopped_count += 1
                 print(f"  已停止: {stopped_count}/{total_threads} 个连接...", end='\r')
-                last_alive_count = alive_count
-            
-            time.sleep(0.2)  # 每0.2秒检查一次
         
         # 清除进度显示
         print(" " * 60, end='\r')
         
-        # 最后再检查一次（可能刚好在循环结束时完成）
-        time.sleep(0.5)
-        alive_threads = [t for t in self.threads if t.is_alive()]
+        alive_threads = [t for t in threads if t.is_alive()]
         
         if alive_threads:
             print(f"警告: 还有 {len(alive_threads)} 个连接未能完全停止（但 ping 进程已终止）")
         
+        self._flush_console()
         print("所有测试已停止\n")
     
     def wait_for_completion(self):
         """等待所有测试完成（支持被信号中断后快速返回）"""
-        for thread in self.threads:
+        # 先等待所有握手完成（此后 ping 线程已全部启动）
+        for thread in self.connect_threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+                if not self.running:
+                    return
+        
+        for thread in list(self.threads):
             while thread.is_alive():
                 thread.join(timeout=0.5)
                 if not self.running:
                     return
+        
+        self._flush_console()
     
     def has_results(self) -> bool:
         """检查是否有任何有效的测试结果"""
@@ -378,21 +679,27 @@ class PingTester:
         Returns:
             报告文件路径
         """
-        # 统一生成报告文本内容（PDF 和 TXT 内容完全一致）
-        report_text = self._build_report_text()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # 生成时间只取一次，报告头和文件名共用
+        generated_at = datetime.now()
+        timestamp = generated_at.strftime("%Y%m%d_%H%M%S")
+        
+        # 统一生成报告文本行（PDF 和 TXT 内容完全一致）
+        report_lines = self._build_report_lines(generated_at)
         
         if report_format == 'pdf':
-            return self._generate_pdf_report(report_text, timestamp, pdf_password)
+            return self._generate_pdf_report(report_lines, timestamp, pdf_password)
         else:
-            return self._generate_txt_report(report_text, timestamp)
+            return self._generate_txt_report(report_lines, timestamp)
     
-    def _build_report_text(self) -> str:
+    def _build_report_lines(self, generated_at: datetime) -> List[str]:
         """
-        构建报告文本内容（PDF 和 TXT 共用同一份内容）
+        构建报告文本行（PDF 直接逐行渲染，TXT 拼接后一次写入）
+        
+        Args:
+            generated_at: 报告生成时间
         
         Returns:
-            完整的报告文本字符串
+            报告文本行列表（不含换行符）
         """
         lines = []
         
@@ -400,14 +707,24 @@ class PingTester:
         lines.append("=" * 80)
         lines.append("批量 Ping 测试报告")
         lines.append("=" * 80)
-        lines.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        lines.append(f"生成时间: {format_datetime(generated_at)}")
         lines.append(f"测试服务器数量: {len(self.servers)} 台")
         lines.append(f"测试连接总数: {len(self.results)} 对")
         lines.append("")
         
+        # 每个结果的丢包率和测试时长只计算一次，统计、丢包摘要和详细结果共用
+        entries = []
+        for result in self.results:
+            if result.end_time:
+                duration_line = f"测试时长: {(result.end_time - result.start_time).total_seconds():.1f} 秒"
+            else:
+                duration_line = "测试时长: 未完成"
+            entries.append((result, result.get_loss_rate(), duration_line))
+        
         # 统计信息
-        total_connections = len(self.results)
-        connections_with_loss = sum(1 for r in self.results if r.lost_packets > 0)
+        total_connections = len(entries)
+        lossy_entries = [entry for entry in entries if entry[0].lost_packets > 0]
+        connections_with_loss = len(lossy_entries)
         connections_without_loss = total_connections - connections_with_loss
         
         lines.append("=" * 80)
@@ -430,22 +747,20 @@ class PingTester:
             lines.append("=" * 80)
             lines.append("丢包情况摘要 ⚠")
             lines.append("=" * 80)
-            for result in self.results:
-                if result.lost_packets > 0:
-                    lines.append("")
-                    lines.append(f"服务器: {result.server_ip} ({result.server_hostname})")
-                    lines.append(f"目标IP: {result.target_ip}")
-                    lines.append(f"总包数: {result.total_packets}, 丢包数: {result.lost_packets}, 丢包率: {result.get_loss_rate():.2f}%")
-                    if result.end_time:
-                        lines.append(f"测试时长: {(result.end_time - result.start_time).total_seconds():.1f} 秒")
-                    else:
-                        lines.append("测试时长: 未完成")
-                    lines.append("")
-                    lines.append("丢包详情:")
-                    for line in result.packet_loss_lines:
-                        lines.append(f"  {line}")
-                    lines.append("")
-                    lines.append("-" * 80)
+            for result, loss_rate, duration_line in lossy_entries:
+                lines.append("")
+                lines.append(f"服务器: {result.server_ip} ({result.server_hostname})")
+                lines.append(f"目标IP: {result.target_ip}")
+                lines.append(f"总包数: {result.total_packets}, 丢包数: {result.lost_packets}, 丢包率: {loss_rate:.2f}%")
+                lines.append(duration_line)
+                lines.append("")
+                lines.append("丢包详情:")
+                loss_lines = result.packet_loss_lines
+                if result.lost_packets > len(loss_lines):
+                    lines.append(f"  ... (仅显示最近 {len(loss_lines)} 条丢包记录，完整记录请查看会话日志文件) ...")
+                lines.extend(f"  {line}" for line in loss_lines)
+                lines.append("")
+                lines.append("-" * 80)
             lines.append("")
         
         # 详细测试结果
@@ -453,77 +768,76 @@ class PingTester:
         lines.append("详细测试结果")
         lines.append("=" * 80)
         
-        for idx, result in enumerate(self.results, 1):
+        output_title = f"Ping 输出摘要（最近 {PingResult.OUTPUT_TAIL_LINES} 行）:"
+        for idx, (result, loss_rate, duration_line) in enumerate(entries, 1):
             lines.append("")
-            lines.append(f"[测试 {idx}/{len(self.results)}]")
+            lines.append(f"[测试 {idx}/{total_connections}]")
             lines.append(f"服务器: {result.server_ip} ({result.server_hostname})")
             lines.append(f"目标IP: {result.target_ip}")
-            lines.append(f"开始时间: {result.start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            end_time_str = result.end_time.strftime('%Y-%m-%d %H:%M:%S') if result.end_time else '未完成'
+            lines.append(f"开始时间: {format_datetime(result.start_time)}")
+            end_time_str = format_datetime(result.end_time) if result.end_time else '未完成'
             lines.append(f"结束时间: {end_time_str}")
-            if result.end_time:
-                lines.append(f"测试时长: {(result.end_time - result.start_time).total_seconds():.1f} 秒")
-            else:
-                lines.append("测试时长: 未完成")
-            lines.append(f"总包数: {result.total_packets}, 丢包数: {result.lost_packets}, 丢包率: {result.get_loss_rate():.2f}%")
+            lines.append(duration_line)
+            lines.append(f"总包数: {result.total_packets}, 丢包数: {result.lost_packets}, 丢包率: {loss_rate:.2f}%")
             
             if result.lost_packets > 0:
                 lines.append("")
-                lines.append(f"⚠️ 警告: 检测到丢包 {result.lost_packets}/{result.total_packets} 个 ({result.get_loss_rate():.2f}%)")
+                lines.append(f"⚠️ 警告: 检测到丢包 {result.lost_packets}/{result.total_packets} 个 ({loss_rate:.2f}%)")
             
             if result.log_file:
                 lines.append("")
                 lines.append(f"完整会话日志: {result.log_file}")
             
             lines.append("")
-            lines.append("Ping 输出摘要（最近 50 行）:")
+            lines.append(output_title)
             lines.append("-" * 80)
             
-            if result.output_lines:
-                output_to_show = result.output_lines[-50:] if len(result.output_lines) > 50 else result.output_lines
-                if len(result.output_lines) > 50:
-                    lines.append(f"... (省略前 {len(result.output_lines) - 50} 行，查看完整输出请查看会话日志文件) ...")
+            output_lines = result.output_lines
+            if output_lines:
+                omitted = result.output_line_count - len(output_lines)
+                if omitted > 0:
+                    lines.append(f"... (省略前 {omitted} 行，查看完整输出请查看会话日志文件) ...")
                     lines.append("")
-                for line in output_to_show:
-                    lines.append(line)
+                lines.extend(output_lines)
             else:
                 lines.append("(无输出记录)")
             
             lines.append("-" * 80)
         
-        return "\n".join(lines) + "\n"
+        return lines
     
-    def _generate_pdf_report(self, report_text: str, timestamp: str, pdf_password: str = None) -> str:
+    def _generate_pdf_report(self, report_lines: List[str], timestamp: str, pdf_password: str = None) -> str:
         """
         生成 PDF 格式报告（内容与 TXT 完全一致，加密保护禁止修改）
         
         Args:
-            report_text: 报告文本内容
+            report_lines: 报告文本行
             timestamp: 时间戳字符串
             pdf_password: PDF 所有者密码
         
         Returns:
             PDF 报告文件路径
         """
-        from .pdf_report import generate_pdf_from_text
+        from .pdf_report import generate_pdf_from_lines
         
         report_file = os.path.join(self.output_dir, f"ping_test_report_{timestamp}.pdf")
-        generate_pdf_from_text(report_text, report_file, owner_password=pdf_password)
+        generate_pdf_from_lines(report_lines, report_file, owner_password=pdf_password)
         return report_file
     
-    def _generate_txt_report(self, report_text: str, timestamp: str) -> str:
+    def _generate_txt_report(self, report_lines: List[str], timestamp: str) -> str:
         """
         生成 TXT 格式报告
         
         Args:
-            report_text: 报告文本内容
+            report_lines: 报告文本行
             timestamp: 时间戳字符串
         
         Returns:
             TXT 报告文件路径
         """
         report_file = os.path.join(self.output_dir, f"ping_test_report_{timestamp}.txt")
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(report_text)
+        # 一次编码、一次写入
+        with open(report_file, 'wb') as f:
+            f.write(("\n".join(report_lines) + "\n").encode('utf-8'))
         return report_file
 
@@ -5,13 +5,18 @@
 """
 
 import os
+import time
 from datetime import datetime
-from typing import TextIO
+from typing import BinaryIO
 
 
 class SessionLogger:
     """会话日志记录器 - 每个连接一个独立的日志文件"""
     
+    # 写入配置：二进制模式 + 大缓冲区，缓冲区满、出现丢包或超过一定时间才写入文件，减少 write 系统调用
+    BUFFER_SIZE = 64 * 1024  # 文件缓冲区大小（字节）
+    FLUSH_INTERVAL = 5.0  # 最长缓冲时间（秒）
+    
     def __init__(self, output_dir: str, session_dir: str, server_ip: str, server_hostname: str, target_ip: str):
         """
         初始化会话日志记录器
@@ -32,25 +37,37 @@ class SessionLogger:
         # 路径: output_dir/sessions/session_dir/filename
         self.log_file = os.path.join(output_dir, "sessions", session_dir, safe_filename)
         
-        # 确保目录存在
-        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        # 以二进制模式打开（由文件缓冲区批量写入，不使用行缓冲）
+        # 会话目录通常已由 PingTester 创建，只有目录不存在时才创建后重试
+        try:
+            self.file_handle: BinaryIO = open(self.log_file, 'wb', buffering=self.BUFFER_SIZE)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            self.file_handle = open(self.log_file, 'wb', buffering=self.BUFFER_SIZE)
+        self._last_flush = time.monotonic()
         
-        # 打开文件
-        self.file_handle: TextIO = open(self.log_file, 'w', encoding='utf-8', buffering=1)  # 行缓冲
+        # 行时间戳的 "YYYY-MM-DD HH:MM:" 前缀按分钟缓存，strftime 每分钟最多调用一次
+        self._ts_minute = None
+        self._ts_prefix = ""
         
         # 写入文件头
         self._write_header()
         
     def _write_header(self):
-        """写入日志文件头"""
-        self.file_handle.write("="*80 + "\n")
-        self.file_handle.write(f"Ping 测试会话日志\n")
-        self.file_handle.write("="*80 + "\n")
-        self.file_handle.write(f"服务器IP: {self.server_ip}\n")
-        self.file_handle.write(f"服务器主机名: {self.server_hostname}\n")
-        self.file_handle.write(f"目标IP: {self.target_ip}\n")
-        self.file_handle.write(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        self.file_handle.write("="*80 + "\n\n")
+        """写入日志文件头（拼接后一次编码、一次写入）"""
+        separator = "=" * 80
+        header = (
+            f"{separator}\n"
+            f"Ping 测试会话日志\n"
+            f"{separator}\n"
+            f"服务器IP: {self.server_ip}\n"
+            f"服务器主机名: {self.server_hostname}\n"
+            f"目标IP: {self.target_ip}\n"
+            f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"{separator}\n\n"
+        )
+        self.file_handle.write(header.encode('utf-8'))
+        self.file_handle.flush()
         
     def log(self, line: str):
         """
@@ -59,8 +76,7 @@ class SessionLogger:
         Args:
             line: 日志内容
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # 保留毫秒
-        self.file_handle.write(f"[{timestamp}] {line}\n")
+        self._write(f"[{self._timestamp()}] {line}\n")
         
     def log_loss(self, line: str):
         """
@@ -69,16 +85,40 @@ class SessionLogger:
         Args:
             line: 丢包信息
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        self.file_handle.write(f"[{timestamp}] ⚠ {line}\n")
+        self._write(f"[{self._timestamp()}] ⚠ {line}\n")
+        self.flush()  # 丢包记录立即写入磁盘
+        
+    def _timestamp(self) -> str:
+        """当前时间字符串（"%Y-%m-%d %H:%M:%S" + 毫秒）"""
+        minute, millis = divmod(time.time_ns() // 1_000_000, 60_000)
+        if minute != self._ts_minute:
+            self._ts_prefix = time.strftime("%Y-%m-%d %H:%M:", time.localtime(minute * 60))
+            self._ts_minute = minute
+        second, millis = divmod(millis, 1000)
+        return f"{self._ts_prefix}{second:02d}.{millis:03d}"
+        
+    def _write(self, text: str):
+        """写入文件缓冲区（缓冲区满时自动写入文件），超过时间阈值时刷新"""
+        self.file_handle.write(text.encode('utf-8', 'replace'))
+        if time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+        
+    def flush(self):
+        """将缓冲区内容写入文件"""
+        self.file_handle.flush()
+        self._last_flush = time.monotonic()
         
     def close(self):
         """关闭日志文件"""
         if self.file_handle and not self.file_handle.closed:
-            self.file_handle.write("\n" + "="*80 + "\n")
-            self.file_handle.write(f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            self.file_handle.write("="*80 + "\n")
-            self.file_handle.close()
+            separator = "=" * 80
+            footer = (
+                f"\n{separator}\n"
+                f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"{separator}\n"
+            )
+            self.file_handle.write(footer.encode('utf-8'))
+            self.file_handle.close()  # close 会先写出缓冲区中的剩余内容
     
     def get_log_file(self) -> str:
         """获取日志文件路径"""
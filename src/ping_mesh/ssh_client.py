@@ -5,19 +5,35 @@ SSH 客户端模块
 """
 
 import paramiko
-import time
+import socket
 import logging
-from typing import Optional, Callable
+from typing import Optional, Callable, List
 import threading
 
 # 抑制 paramiko 内部的错误日志（如 "Error reading SSH protocol banner"）
 # 这些错误在重试机制中会被处理，不需要打印到控制台
 logging.getLogger("paramiko").setLevel(logging.CRITICAL)
 
+# 优先协商的加密算法：AES-GCM 为 AEAD 模式，加密与完整性校验一次完成（无需额外 HMAC），
+# 且可利用 CPU 的 AES-NI 指令；服务器不支持时按 paramiko 默认顺序回退
+PREFERRED_CIPHERS = ('aes128-gcm@openssh.com', 'aes256-gcm@openssh.com')
+
+
+def _create_transport(sock, **kwargs) -> paramiko.Transport:
+    """创建 SSH Transport，并将 PREFERRED_CIPHERS 调整到协商列表最前面"""
+    transport = paramiko.Transport(sock, **kwargs)
+    options = transport.get_security_options()
+    preferred = [c for c in PREFERRED_CIPHERS if c in options.ciphers]
+    options.ciphers = tuple(preferred + [c for c in options.ciphers if c not in preferred])
+    return transport
+
 
 class SSHClient:
     """SSH 客户端封装"""
     
+    READ_TIMEOUT = 1.0  # 读取输出的最长阻塞时间（秒），超时后检查停止标志
+    DRAIN_TIMEOUT = 0.3  # 停止后等待剩余输出（ping 统计信息）的空闲超时（秒）
+    
     def __init__(self, host: str, username: str, password: str, port: int = 22):
         """
         初始化 SSH 客户端
@@ -33,9 +49,12 @@ class SSHClient:
         self.password = password
         self.port = port
         self.client = None
-        self.channel = None
-        self.hostname = None
-        self.should_stop = False  # 停止标志
+        self.channels = []  # 同一连接上所有 ping 通道（每个目标 IP 一个）
+        self.channels_lock = threading.Lock()
+        self.hostname = None  # 远程主机名（首次调用 get_hostname 时查询并缓存）
+        self.hostname_lock = threading.Lock()
+        self.stop_event = threading.Event()  # 停止事件（stop_ping 设置，所有读取线程可见）
+        self.last_error = None  # 最近一次连接失败的原因（由调用方决定如何输出）
         
     def connect(self, timeout: int = 15, banner_timeout: int = 30, retries: int = 3) -> bool:
         """
@@ -47,11 +66,15 @@ class SSHClient:
             retries: 重试次数
             
         Returns:
-            连接是否成功
+            连接是否成功（失败原因见 last_error）；stop_ping 后不再发起新的尝试
         """
         last_error = None
         
         for attempt in range(retries):
+            # 测试已停止，放弃剩余的重试
+            if self.stop_event.is_set():
+                break
+            
             try:
                 self.client = paramiko.SSHClient()
                 self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -63,13 +86,10 @@ class SSHClient:
                     timeout=timeout,
                     banner_timeout=banner_timeout,
                     look_for_keys=False,
-                    allow_agent=False
+                    allow_agent=False,
+                    transport_factory=_create_transport
                 )
                 
-                # 获取主机名
-                stdin, stdout, stderr = self.client.exec_command('hostname')
-                self.hostname = stdout.read().decode('utf-8').strip()
-                
                 return True
             except Exception as e:
                 last_error = e
@@ -80,106 +100,172 @@ class SSHClient:
                         pass
                     self.client = None
                 
-                # 如果还有重试机会，等待后重试
+                # 如果还有重试机会，等待后重试（退避期间 stop_ping 立即唤醒）
                 if attempt < retries - 1:
                     wait_time = (attempt + 1) * 2  # 指数退避: 2s, 4s
-                    time.sleep(wait_time)
+                    if self.stop_event.wait(wait_time):
+                        break
+        
+        if self.stop_event.is_set():
+            self.last_error = "测试已停止"
+            return False
         
         # 所有重试都失败
-        print(f"连接服务器 {self.host} 失败 (已重试 {retries} 次): {str(last_error)}")
+        self.last_error = f"{str(last_error)} (已重试 {retries} 次)"
         return False
     
     def get_hostname(self) -> str:
-        """获取主机名"""
+        """
+        获取主机名（只在远程执行一次 hostname 命令，结果缓存供共享连接的所有目标使用）
+        
+        Returns:
+            远程主机名，查询失败时返回服务器地址
+        """
+        with self.hostname_lock:
+            if self.hostname is None:
+                try:
+                    stdin, stdout, stderr = self.client.exec_command('hostname')
+                    self.hostname = stdout.read().decode('utf-8').strip()
+                except Exception:
+                    self.hostname = ''
         return self.hostname or self.host
     
     def execute_ping(self, target_ip: str, callback: Optional[Callable] = None) -> None:
         """
         执行 ping 命令（持续 ping）
         
+        同一连接可在多个线程中并发调用，每次调用在共享的 SSH 连接上
+        打开一个独立通道，避免为每个目标 IP 重复建立 SSH 连接。
+        
         Args:
             target_ip: 目标IP地址
             callback: 回调函数，用于处理每行输出
         """
         try:
-            # 使用 -O 选项来显示无应答的包
-            command = f"ping {target_ip} -O"
-            
-            # 创建交互式 shell
-            self.channel = self.client.invoke_shell()
-            self.channel.send(command + '\n')
+            channel = self.open_ping_channel(target_ip)
+        except Exception as e:
+            if callback:
+                callback(f"执行 ping 命令出错: {str(e)}")
+            return
+        
+        self.read_ping_output(channel, callback)
+    
+    def open_ping_channel(self, target_ip: str):
+        """
+        在共享连接上打开独立通道并启动 ping
+        
+        通道数受服务器 sshd 的 MaxSessions 限制（OpenSSH 默认 10），超出时抛出异常，
+        由调用方将该目标记为启动失败。
+        
+        Args:
+            target_ip: 目标IP地址
             
-            # 持续读取输出
-            buffer = ""
-            while not self.should_stop:
-                if self.channel.recv_ready():
-                    chunk = self.channel.recv(4096).decode('utf-8', errors='ignore')
-                    buffer += chunk
-                    
-                    # 按行处理
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        line = line.strip()
-                        
-                        # 过滤掉命令行提示符和空行
-                        if line and not line.endswith('$') and not line.endswith('#'):
-                            if callback:
-                                callback(line)
+        Returns:
+            正在执行 ping 的通道
+        """
+        # 使用 -O 选项来显示无应答的包
+        command = f"ping {target_ip} -O"
+        
+        # 直接执行 ping（不启动交互式 shell，没有提示符和命令回显）；
+        # 分配 PTY 使 Ctrl+C 以 SIGINT 中断 ping，ping 退出前会输出统计信息
+        channel = self.client.get_transport().open_session()
+        with self.channels_lock:
+            self.channels.append(channel)
+        channel.get_pty()
+        channel.exec_command(command)
+        return channel
+    
+    def read_ping_output(self, channel, callback: Optional[Callable] = None) -> None:
+        """
+        读取 ping 通道的输出直到停止或 ping 退出
+        
+        Args:
+            channel: open_ping_channel 返回的通道
+            callback: 回调函数，用于处理每行输出
+        """
+        try:
+            # 持续读取输出（按字节缓冲，只对完整的行解码，避免多字节字符被 chunk 截断）
+            # 带超时的阻塞读取：数据到达立即返回，空闲时不轮询
+            channel.settimeout(self.READ_TIMEOUT)
+            buffer = b""
+            while not self.stop_event.is_set():
+                try:
+                    data = channel.recv(4096)
+                except socket.timeout:
+                    continue
                 
-                # 检查连接是否关闭
-                if self.channel.exit_status_ready():
+                # 通道已关闭（ping 已退出）
+                if not data:
                     break
                 
-                time.sleep(0.1)
-            
-            # 循环退出后，快速读取剩余的缓冲区（包括 ping 的统计信息）
-            time.sleep(0.3)  # 稍微等待 ping 统计输出（从0.5秒减少到0.3秒）
+                buffer += data
+                
+                # 按行处理，最后一段不完整的行留在缓冲区
+                *lines, buffer = buffer.split(b'\n')
+                self._dispatch_lines(lines, callback)
             
-            # 快速读取所有剩余数据（最多尝试10次，避免无限等待）
+            # 循环退出后，读取剩余输出（包括 ping 的统计信息），
+            # 空闲超过 DRAIN_TIMEOUT 即结束（最多读取 10 次，避免无限等待）
+            channel.settimeout(self.DRAIN_TIMEOUT)
             for _ in range(10):
-                if not self.channel.recv_ready():
-                    break
-                
                 try:
-                    chunk = self.channel.recv(4096).decode('utf-8', errors='ignore')
-                    buffer += chunk
-                    time.sleep(0.05)  # 短暂延迟（从0.1秒减少到0.05秒）
-                except:
+                    data = channel.recv(4096)
+                except Exception:
+                    break
+                if not data:
                     break
+                buffer += data
             
             # 处理所有缓冲的内容
-            while '\n' in buffer:
-                line, buffer = buffer.split('\n', 1)
-                line = line.strip()
-                if line and not line.endswith('$') and not line.endswith('#'):
-                    if callback:
-                        callback(line)
+            *lines, buffer = buffer.split(b'\n')
+            self._dispatch_lines(lines, callback)
             
             # 处理最后可能没有换行符的内容
-            if buffer.strip():
+            tail = buffer.decode('utf-8', errors='ignore').strip()
+            if tail:
                 if callback:
-                    callback(buffer.strip())
+                    callback(tail)
                 
         except Exception as e:
             if callback:
                 callback(f"执行 ping 命令出错: {str(e)}")
     
+    @staticmethod
+    def _dispatch_lines(lines: List[bytes], callback: Optional[Callable]) -> None:
+        """
+        解码完整的输出行并交给回调处理
+        
+        Args:
+            lines: 原始字节行（不含换行符）
+            callback: 回调函数
+        """
+        for raw in lines:
+            line = raw.decode('utf-8', errors='ignore').strip()
+            
+            # 过滤掉空行
+            if line and callback:
+                callback(line)
+    
     def stop_ping(self):
         """
         停止 ping 命令 - 模拟手动 Ctrl+C 的方式
         
         流程：
-        1. 设置停止标志，让 execute_ping 的循环退出
-        2. 发送 Ctrl+C 到远程服务器停止 ping
+        1. 设置停止事件，让 execute_ping 的循环退出
+        2. 向该连接上的每个 ping 通道发送 Ctrl+C
         3. execute_ping 会读取 ping 的统计信息后退出
         """
-        try:
-            # 1. 设置停止标志
-            self.should_stop = True
-            
-            # 2. 发送 Ctrl+C 停止 ping（模拟手动操作）
-            if self.channel and not self.channel.closed:
-                self.channel.send('\x03')
+        # 1. 设置停止事件
+        self.stop_event.set()
+        
+        with self.channels_lock:
+            channels = list(self.channels)
+        
+        for channel in channels:
+            try:
+                # 2. 发送 Ctrl+C 停止 ping（模拟手动操作）
+                if not channel.closed:
+                    channel.send('\x03')
                 
                 # ping 收到 Ctrl+C 后会输出统计信息：
                 # ^C
@@ -189,16 +275,23 @@ class SSHClient:
                 
                 # execute_ping 会继续读取这些统计信息并通过回调记录
                 
-        except Exception as e:
-            pass  # 停止时的错误可以忽略
+            except Exception as e:
+                pass  # 停止时的错误可以忽略
     
-    def close(self):
-        """关闭连接"""
+    def close(self) -> Optional[str]:
+        """
+        关闭连接
+        
+        Returns:
+            关闭失败时的错误信息（由调用方决定如何输出），成功时返回 None
+        """
         try:
-            if self.channel:
-                self.channel.close()
+            with self.channels_lock:
+                for channel in self.channels:
+                    channel.close()
             if self.client:
                 self.client.close()
         except Exception as e:
-            print(f"关闭连接失败: {str(e)}")
+            return f"关闭连接失败: {self.host}: {str(e)}"
+        return None
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+config_loader 模块测试
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from ping_mesh import config_loader
+from ping_mesh.config_loader import ConfigLoader
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'cache'
+    monkeypatch.setattr(config_loader, 'CACHE_DIR', str(path))
+    return path
+
+
+def write_config(path, rows):
+    pd.DataFrame(rows).to_excel(path, index=False)
+
+
+def test_load_config(tmp_path):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {
+        'ip': ['10.0.0.1', None, '10.0.0.3'],
+        'user': ['admin', 'root', None],
+        'pass': ['secret', 'x', None],
+        'dip1': ['8.8.8.8', '8.8.8.8', '1.1.1.1'],
+        'dip2': ['8.8.4.4', None, None],
+    })
+
+    servers = ConfigLoader(str(excel)).load_config()
+
+    assert servers == [
+        {'ip': '10.0.0.1', 'user': 'admin', 'password': 'secret', 'target_ips': ['8.8.8.8', '8.8.4.4']},
+        {'ip': '10.0.0.3', 'user': 'root', 'password': '', 'target_ips': ['1.1.1.1']},
+    ]
+
+
+def test_missing_ip_column(tmp_path):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'host': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+
+    with pytest.raises(ValueError):
+        ConfigLoader(str(excel)).load_config()
+
+
+def test_row_without_targets_is_skipped(tmp_path):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'ip': ['10.0.0.1', '10.0.0.2'], 'dip1': [None, '8.8.8.8']})
+
+    servers = ConfigLoader(str(excel)).load_config()
+
+    assert [s['ip'] for s in servers] == ['10.0.0.2']
+
+
+def test_cache_disabled_by_default(tmp_path, cache_dir):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'ip': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+
+    ConfigLoader(str(excel)).load_config()
+
+    assert not cache_dir.exists()
+
+
+def test_cache_round_trip_and_prune(tmp_path, cache_dir):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'ip': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+
+    first = ConfigLoader(str(excel), use_cache=True).load_config()
+    cache_files = os.listdir(cache_dir)
+    assert len(cache_files) == 1
+    assert f"_v{config_loader.CACHE_FORMAT_VERSION}_" in cache_files[0]
+    assert ConfigLoader(str(excel), use_cache=True).load_config() == first
+
+    # 其他配置文件的缓存不受影响
+    (cache_dir / 'servers_backup_{}.json'.format('0' * 64)).write_text('[]')
+
+    # 配置修改后重新解析，并删除该配置文件的旧缓存
+    write_config(excel, {'ip': ['10.0.0.2'], 'dip1': ['8.8.8.8']})
+    second = ConfigLoader(str(excel), use_cache=True).load_config()
+
+    assert second[0]['ip'] == '10.0.0.2'
+    remaining = sorted(os.listdir(cache_dir))
+    assert len(remaining) == 2
+    assert 'servers_backup_{}.json'.format('0' * 64) in remaining
+    assert cache_files[0] not in remaining
+
+
+def test_corrupt_cache_falls_back_to_excel(tmp_path, cache_dir):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'ip': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+    loader = ConfigLoader(str(excel), use_cache=True)
+
+    loader.load_config()
+    with open(loader._get_cache_file(), 'w', encoding='utf-8') as f:
+        f.write('{not json')
+
+    assert loader.load_config()[0]['ip'] == '10.0.0.1'
+
+
+def test_same_name_in_different_directories(tmp_path, cache_dir):
+    site_a = tmp_path / 'siteA'
+    site_b = tmp_path / 'siteB'
+    site_a.mkdir()
+    site_b.mkdir()
+    write_config(site_a / 'servers.xlsx', {'ip': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+    write_config(site_b / 'servers.xlsx', {'ip': ['10.0.0.2'], 'dip1': ['8.8.8.8']})
+
+    ConfigLoader(str(site_a / 'servers.xlsx'), use_cache=True).load_config()
+    ConfigLoader(str(site_b / 'servers.xlsx'), use_cache=True).load_config()
+
+    # 两个配置文件的缓存同时保留，各自命中
+    assert len(os.listdir(cache_dir)) == 2
+    loader = ConfigLoader(str(site_a / 'servers.xlsx'), use_cache=True)
+    loader._parse_excel = None  # 命中缓存时不会解析 Excel
+    assert loader.load_config()[0]['ip'] == '10.0.0.1'
+
+
+def test_prunes_legacy_cache_names(tmp_path, cache_dir):
+    excel = tmp_path / 'servers.xlsx'
+    write_config(excel, {'ip': ['10.0.0.1'], 'dip1': ['8.8.8.8']})
+    cache_dir.mkdir()
+    (cache_dir / 'servers_{}.json'.format('a' * 64)).write_text('[]')
+    (cache_dir / 'servers_v1_{}.json'.format('b' * 64)).write_text('[]')
+
+    loader = ConfigLoader(str(excel), use_cache=True)
+    loader.load_config()
+
+    assert os.listdir(cache_dir) == [os.path.basename(loader._get_cache_file())]
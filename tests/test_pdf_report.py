@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+pdf_report 模块测试
+"""
+
+import math
+import sys
+
+import pytest
+
+from ping_mesh import pdf_report
+from ping_mesh.pdf_report import generate_pdf_from_lines
+
+
+LINES = ["批量 Ping 测试报告", "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms"]
+
+
+def test_aes256_encryption_with_pikepdf(tmp_path):
+    pikepdf = pytest.importorskip('pikepdf')
+    output = tmp_path / 'report.pdf'
+
+    generate_pdf_from_lines(LINES, str(output), owner_password='owner-pw')
+
+    # 无需密码即可打开，加密为 AES-256（R=6），只允许打印
+    with pikepdf.open(output) as pdf:
+        assert pdf.is_encrypted
+        assert pdf.encryption.R == 6
+        assert pdf.encryption.bits == 256
+        assert pdf.encryption.stream_method == pikepdf.models.EncryptionMethod.aesv3
+        assert pdf.allow.print_highres
+        assert not pdf.allow.extract
+        assert not pdf.allow.modify_other
+        assert not pdf.allow.modify_annotation
+    with pikepdf.open(output, password='owner-pw') as pdf:
+        assert pdf.owner_password_matched
+
+
+def test_falls_back_to_reportlab_encryption(tmp_path, monkeypatch):
+    # 模拟未安装 pikepdf
+    monkeypatch.setitem(sys.modules, 'pikepdf', None)
+    output = tmp_path / 'report.pdf'
+
+    generate_pdf_from_lines(LINES, str(output))
+
+    data = output.read_bytes()
+    assert data.startswith(b'%PDF')
+    assert b'/Encrypt' in data
+
+
+LINES_PER_PAGE = int((pdf_report.TEXT_TOP - pdf_report.TEXT_BOTTOM) // pdf_report.LINE_HEIGHT)
+
+
+def body_text_objects(pikepdf, page):
+    """返回页面正文（字号 FONT_SIZE）的文本对象，每个为该对象内的 (操作符, 操作数) 列表"""
+    objects = []
+    current = None
+    for operands, operator in pikepdf.parse_content_stream(page):
+        op = str(operator)
+        if op == 'BT':
+            current = []
+        elif op == 'ET':
+            if any(o == 'Tf' and args[1] == pdf_report.FONT_SIZE for o, args in current):
+                objects.append(current)
+            current = None
+        elif current is not None:
+            current.append((op, list(operands)))
+    return objects
+
+
+class TestPagination:
+
+    @pytest.mark.parametrize('line_count', [0, 1, LINES_PER_PAGE, LINES_PER_PAGE + 1, LINES_PER_PAGE * 2 + 5])
+    def test_one_text_object_per_page(self, tmp_path, line_count):
+        pikepdf = pytest.importorskip('pikepdf')
+        lines = [f"line {i}" for i in range(line_count)]
+        output = tmp_path / 'report.pdf'
+
+        generate_pdf_from_lines(lines, str(output))
+
+        with pikepdf.open(output) as pdf:
+            assert len(pdf.pages) == max(1, math.ceil(line_count / LINES_PER_PAGE))
+            drawn = []
+            for page in pdf.pages:
+                objects = body_text_objects(pikepdf, page)
+                assert len(objects) == (1 if lines else 0)
+                for ops in objects:
+                    drawn.extend(str(args[0]) for op, args in ops if op == 'Tj')
+        assert drawn == lines
+
+    def test_font_set_once_per_run(self, tmp_path):
+        pikepdf = pytest.importorskip('pikepdf')
+        lines = ["ascii 1", "ascii 2", "ascii 3", "中文", "ascii 4"]
+        output = tmp_path / 'report.pdf'
+
+        generate_pdf_from_lines(lines, str(output))
+
+        with pikepdf.open(output) as pdf:
+            ops = body_text_objects(pikepdf, pdf.pages[0])[0]
+        # 连续三行 ASCII 只设置一次字体（reportlab 对 CID 字体的每行会自行重复 Tf，中文行不做限定）
+        third = next(i for i, (op, args) in enumerate(ops) if op == 'Tj' and str(args[0]) == "ascii 3")
+        assert [op for op, _ in ops[:third]].count('Tf') == 1
+        fonts = [str(args[0]) for op, args in ops if op == 'Tf']
+        assert len(set(fonts)) == 2
+        # 中文之后切回等宽字体
+        assert fonts[-1] == fonts[0]
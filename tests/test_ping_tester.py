@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+ping_tester 模块测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from ping_mesh import ping_tester
+from ping_mesh.ping_tester import (
+    LINE_LOSS,
+    LINE_OTHER,
+    LINE_REPLY,
+    PingResult,
+    PingTester,
+    classify_line,
+    format_timestamp,
+    group_servers_by_ip,
+    split_server_groups,
+)
+
+
+REPLY = "64 bytes from 8.8.8.8: icmp_seq={} ttl=117 time=20.1 ms"
+LOSS = "no answer yet for icmp_seq={}"
+
+
+class FakeSSHClient:
+    """按预设输出行模拟 execute_ping 的 SSH 客户端"""
+
+    def __init__(self, lines, open_error=None, close_error=None):
+        self.lines = lines
+        self.open_error = open_error
+        self.close_error = close_error
+        self.closed = False
+
+    def open_ping_channel(self, target_ip):
+        if self.open_error:
+            raise self.open_error
+        return target_ip
+
+    def read_ping_output(self, channel, callback=None):
+        for line in self.lines:
+            callback(line)
+
+    def close(self):
+        self.closed = True
+        return self.close_error
+
+
+class FakeClock:
+    """替换 ping_tester 模块中的 time，sleep 只推进时间不真正等待"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_server(ip, target_ips, user='root', password='x'):
+    return {'ip': ip, 'user': user, 'password': password, 'target_ips': target_ips}
+
+
+@pytest.fixture
+def tester(tmp_path):
+    return PingTester([make_server('10.0.0.1', ['8.8.8.8'])], str(tmp_path))
+
+
+def run_ping(tester, lines, open_error=None, close_error=None):
+    """在当前线程运行一次 ping 测试，返回控制台消息和结果"""
+    messages = []
+    tester._emit = messages.append
+    client = FakeSSHClient(lines, open_error, close_error)
+    tester.client_refs[client] = 1
+
+    tester._run_ping_test(client, tester.servers[0], 'host-1', '8.8.8.8')
+
+    assert client.closed
+    return messages, tester.results[0] if tester.results else None
+
+
+class TestClassifyLine:
+
+    @pytest.mark.parametrize('line', [
+        REPLY.format(1),
+        "64 bytes from 8.8.8.8: icmp_seq=2 ttl=117 time=0.1 ms (DUP!)",
+    ])
+    def test_reply(self, line):
+        assert classify_line(line) == LINE_REPLY
+
+    @pytest.mark.parametrize('line', [
+        LOSS.format(3),
+        "Request timeout for icmp_seq 4",
+        "ping: sendmsg: timeout",
+    ])
+    def test_loss(self, line):
+        assert classify_line(line) == LINE_LOSS
+
+    @pytest.mark.parametrize('line', [
+        "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.",
+        "--- 8.8.8.8 ping statistics ---",
+        "10 packets transmitted, 8 received, 20% packet loss, time 9012ms",
+        "^C",
+    ])
+    def test_other(self, line):
+        assert classify_line(line) == LINE_OTHER
+
+
+class TestPingResult:
+
+    def test_counts_losses_and_resets_on_reply(self):
+        result = PingResult('10.0.0.1', 'host-1', '8.8.8.8')
+
+        assert result.add_output(LOSS.format(1)) == LINE_LOSS
+        assert result.add_output(LOSS.format(2)) == LINE_LOSS
+        assert result.consecutive_losses == 2
+
+        assert result.add_output(REPLY.format(3)) == LINE_REPLY
+        assert result.consecutive_losses == 0
+        assert result.lost_packets == 2
+        assert len(result.packet_loss_lines) == 2
+
+    def test_read_lines_while_ping_thread_appends(self, monkeypatch):
+        monkeypatch.setattr(PingResult, 'MAX_LOSS_LINES', 100)
+        result = PingResult('10.0.0.1', 'host-1', '8.8.8.8')
+        stop = threading.Event()
+
+        def append():
+            seq = 0
+            while not stop.is_set():
+                seq += 1
+                result.add_output(REPLY.format(seq) if seq % 2 else LOSS.format(seq))
+
+        writer = threading.Thread(target=append)
+        writer.start()
+        try:
+            for _ in range(2000):
+                assert len(result.output_lines) <= PingResult.OUTPUT_TAIL_LINES
+                result.packet_loss_lines
+        finally:
+            stop.set()
+            writer.join()
+
+
+class TestRecoveryNotice:
+
+    def test_reports_losses_before_recovery(self, tester):
+        lines = [REPLY.format(1), LOSS.format(2), LOSS.format(3), REPLY.format(4)]
+
+        messages, result = run_ping(tester, lines)
+
+        recovered = [m for m in messages if '恢复正常' in m]
+        assert recovered == ["✓ 恢复正常: 10.0.0.1(host-1) -> 8.8.8.8: 共丢失 2 个包后恢复"]
+        assert result.consecutive_losses == 0
+
+    def test_statistics_after_loss_are_not_recovery(self, tester):
+        lines = [
+            LOSS.format(1),
+            "^C",
+            "--- 8.8.8.8 ping statistics ---",
+            "1 packets transmitted, 0 received, 100% packet loss, time 0ms",
+        ]
+
+        messages, result = run_ping(tester, lines)
+
+        assert not [m for m in messages if '恢复正常' in m]
+        assert result.end_time is not None
+
+    def test_loss_alerts_on_first_and_every_tenth(self, tester):
+        lines = [LOSS.format(seq) for seq in range(1, 21)]
+
+        messages, _ = run_ping(tester, lines)
+
+        alerts = [m for m in messages if '丢包检测' in m]
+        assert len(alerts) == 3
+        assert alerts[0].endswith('开始丢包')
+        assert alerts[1].endswith('已连续丢包 10 个')
+        assert alerts[2].endswith('已连续丢包 20 个')
+
+
+class TestGroupServers:
+
+    def test_merges_targets_of_same_server(self):
+        servers = [
+            make_server('10.0.0.1', ['t1']),
+            make_server('10.0.0.2', ['t3']),
+            make_server('10.0.0.1', ['t1', 't2']),
+        ]
+
+        groups = group_servers_by_ip(servers)
+
+        assert [(g['ip'], g['target_ips']) for g in groups] == [
+            ('10.0.0.1', ['t1', 't2']),
+            ('10.0.0.2', ['t3']),
+        ]
+        # 不修改原始配置
+        assert servers[0]['target_ips'] == ['t1']
+
+    def test_keeps_rows_with_different_credentials(self):
+        servers = [
+            make_server('10.0.0.1', ['t1'], user='root', password='a'),
+            make_server('10.0.0.1', ['t2'], user='admin', password='b'),
+        ]
+
+        groups = group_servers_by_ip(servers)
+
+        assert [(g['user'], g['password'], g['target_ips']) for g in groups] == [
+            ('root', 'a', ['t1']),
+            ('admin', 'b', ['t2']),
+        ]
+
+    def test_total_tasks_counts_merged_targets(self, tmp_path):
+        servers = [make_server('10.0.0.1', ['t1']), make_server('10.0.0.1', ['t1', 't2'])]
+
+        tester = PingTester(servers, str(tmp_path))
+
+        assert tester.total_tasks == 2
+        assert tester.get_summary()['failed_connections'] == 2
+
+    def test_splits_targets_across_connections(self, tmp_path):
+        servers = [
+            make_server('10.0.0.1', [f't{i}' for i in range(1, 5)]),
+            make_server('10.0.0.1', [f't{i}' for i in range(5, 9)]),
+            make_server('10.0.0.1', [f't{i}' for i in range(9, 13)]),
+        ]
+
+        tester = PingTester(servers, str(tmp_path))
+
+        assert [len(g['target_ips']) for g in tester.server_groups] == [8, 4]
+        assert all(len(g['target_ips']) <= PingTester.MAX_CHANNELS_PER_CONNECTION
+                   for g in tester.server_groups)
+        assert tester.total_tasks == 12
+
+    def test_split_keeps_small_groups(self):
+        groups = [make_server('10.0.0.1', ['t1', 't2'])]
+
+        assert split_server_groups(groups, 8) == groups
+
+    def test_channel_open_failure_is_failed_task(self, tester):
+        messages, result = run_ping(
+            tester, [REPLY.format(1)], open_error=RuntimeError('ChannelException(1, ...)')
+        )
+
+        assert result is None
+        assert messages == ["✗ 无法启动 ping: 10.0.0.1 -> 8.8.8.8: ChannelException(1, ...)"]
+        assert tester.get_summary()['failed_connections'] == 1
+
+
+class TestConnectWorkers:
+
+    def test_stopped_worker_leaves_queued_servers(self, tester):
+        tester.active_connect_workers = 1
+        tester.connect_queue.put(tester.server_groups[0])
+        tester.running = False
+
+        tester._connect_worker()
+
+        assert tester.connect_queue.qsize() == 1
+        assert tester.active_connect_workers == 0
+
+    def test_connect_after_stop_reports_nothing(self, tester, monkeypatch):
+        messages = []
+        tester._emit = messages.append
+        tester.running = True
+        # 等待发起间隔期间测试被停止
+        monkeypatch.setattr(tester, '_wait_connection_interval', lambda: setattr(tester, 'running', False))
+
+        assert tester._connect(tester.server_groups[0]) is None
+        assert messages == []
+        assert not tester.connecting_clients
+
+
+class TestCloseClient:
+
+    def test_close_error_goes_through_console_writer(self, tester, capsys):
+        messages, _ = run_ping(tester, [REPLY.format(1)], close_error="关闭连接失败: 10.0.0.1: EOF")
+
+        assert messages[-1] == "✗ 关闭连接失败: 10.0.0.1: EOF"
+        assert capsys.readouterr().out == ""
+
+
+class TestFormatTimestamp:
+
+    @pytest.mark.parametrize('epoch', [0, 59, 60, 1700000000, 1700000059, 1700000060])
+    def test_matches_strftime(self, epoch):
+        expected = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+        assert format_timestamp(epoch) == expected
+
+    def test_output_lines_use_arrival_time(self):
+        result = PingResult('10.0.0.1', 'host-1', '8.8.8.8')
+        result.add_output(REPLY.format(1))
+
+        stamp, line = result.output_lines[0].split('] ', 1)
+        assert line == REPLY.format(1)
+        assert abs(time.mktime(time.strptime(stamp[1:], "%Y-%m-%d %H:%M:%S")) - time.time()) < 5
+
+
+class TestConnectionPacing:
+
+    def test_burst_then_interval(self, tmp_path, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(ping_tester, 'time', clock)
+        servers = [make_server(f'10.0.0.{i}', ['t1']) for i in range(1, 6)]
+        tester = PingTester(servers, str(tmp_path), max_concurrent=3, connection_interval=0.5)
+
+        starts = []
+        for _ in servers:
+            tester._wait_connection_interval()
+            starts.append(clock.now - 1000.0)
+
+        assert starts == pytest.approx([0.0, 0.0, 0.0, 0.5, 1.0])
+
+    def test_idle_time_refills_burst(self, tmp_path, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(ping_tester, 'time', clock)
+        servers = [make_server(f'10.0.0.{i}', ['t1']) for i in range(1, 3)]
+        tester = PingTester(servers, str(tmp_path), max_concurrent=2, connection_interval=0.5)
+
+        for _ in range(3):
+            tester._wait_connection_interval()
+        clock.now += 10
+
+        tester._wait_connection_interval()
+        tester._wait_connection_interval()
+
+        # 只有第 3 次握手需要等待，空闲后的两次握手立即发起
+        assert clock.sleeps == pytest.approx([0.5])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+session_logger 模块测试
+"""
+
+import os
+import re
+import time
+
+import pytest
+
+from ping_mesh.session_logger import SessionLogger
+
+
+def make_logger(tmp_path, session_dir='20260101_000000'):
+    return SessionLogger(str(tmp_path), session_dir, '10.0.0.1', 'host-1', '8.8.8.8')
+
+
+def read_log(logger):
+    with open(logger.get_log_file(), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+class TestBufferedWrites:
+
+    def test_creates_missing_session_dir(self, tmp_path):
+        logger = make_logger(tmp_path, 'new_session')
+        logger.close()
+
+        assert logger.get_log_file() == os.path.join(
+            str(tmp_path), 'sessions', 'new_session', '10_0_0_1_to_8_8_8_8.log'
+        )
+        assert os.path.exists(logger.get_log_file())
+
+    def test_lines_buffered_until_flush(self, tmp_path):
+        logger = make_logger(tmp_path)
+        size_after_header = os.path.getsize(logger.get_log_file())
+
+        logger.log("64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms")
+        assert os.path.getsize(logger.get_log_file()) == size_after_header
+
+        logger.close()
+        assert "icmp_seq=1" in read_log(logger)
+
+    def test_loss_written_immediately(self, tmp_path):
+        logger = make_logger(tmp_path)
+
+        logger.log("64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms")
+        logger.log_loss("no answer yet for icmp_seq=2")
+
+        content = read_log(logger)
+        assert "icmp_seq=1" in content
+        assert "] ⚠ no answer yet for icmp_seq=2\n" in content
+        logger.close()
+
+    def test_flush_after_interval(self, tmp_path, monkeypatch):
+        logger = make_logger(tmp_path)
+        monkeypatch.setattr(logger, '_last_flush', logger._last_flush - SessionLogger.FLUSH_INTERVAL)
+
+        logger.log("line 1")
+
+        assert "line 1" in read_log(logger)
+        logger.close()
+
+    def test_unencodable_text_is_replaced(self, tmp_path):
+        logger = make_logger(tmp_path)
+
+        logger.log("bad \udcff byte")
+        logger.close()
+
+        assert "] bad ? byte\n" in read_log(logger)
+
+
+class TestTimestamp:
+
+    @pytest.mark.parametrize('epoch_ms', [
+        1699999980000,  # 整分钟
+        1700000039999,  # 分钟内最后 1 毫秒
+        1700000040001,  # 下一分钟
+        1700000123456,
+    ])
+    def test_matches_strftime(self, tmp_path, monkeypatch, epoch_ms):
+        logger = make_logger(tmp_path)
+        monkeypatch.setattr(time, 'time_ns', lambda: epoch_ms * 1_000_000 + 999)
+
+        expected = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch_ms // 1000))
+        assert logger._timestamp() == f"{expected}.{epoch_ms % 1000:03d}"
+        logger.close()
+
+    def test_prefix_refreshed_on_new_minute(self, tmp_path, monkeypatch):
+        logger = make_logger(tmp_path)
+        now_ms = [1700000039500]
+        monkeypatch.setattr(time, 'time_ns', lambda: now_ms[0] * 1_000_000)
+
+        first = logger._timestamp()
+        now_ms[0] += 1000
+        second = logger._timestamp()
+
+        assert first == time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(1700000039)) + ".500"
+        assert second == time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(1700000040)) + ".500"
+        logger.close()
+
+
+class TestHeaderFooter:
+
+    def test_log_file_layout(self, tmp_path):
+        logger = make_logger(tmp_path)
+        logger.log("PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.")
+        logger.close()
+
+        separator = "=" * 80
+        pattern = (
+            rf"{separator}\n"
+            r"Ping 测试会话日志\n"
+            rf"{separator}\n"
+            r"服务器IP: 10\.0\.0\.1\n"
+            r"服务器主机名: host-1\n"
+            r"目标IP: 8\.8\.8\.8\n"
+            r"开始时间: \d{4}-\d\d-\d\d \d\d:\d\d:\d\d\n"
+            rf"{separator}\n\n"
+            r"\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}\] PING 8\.8\.8\.8 \(8\.8\.8\.8\) 56\(84\) bytes of data\.\n"
+            rf"\n{separator}\n"
+            r"结束时间: \d{4}-\d\d-\d\d \d\d:\d\d:\d\d\n"
+            rf"{separator}\n"
+        )
+        assert re.fullmatch(pattern, read_log(logger))
+
+    def test_header_on_disk_before_first_line(self, tmp_path):
+        logger = make_logger(tmp_path)
+
+        assert read_log(logger).startswith("=" * 80 + "\nPing 测试会话日志\n")
+        logger.close()
+
+    def test_close_twice_writes_one_footer(self, tmp_path):
+        logger = make_logger(tmp_path)
+        logger.close()
+        logger.close()
+
+        assert read_log(logger).count("结束时间") == 1
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+ssh_client 模块测试（使用模拟通道，不建立真实 SSH 连接）
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from ping_mesh.ssh_client import SSHClient
+
+
+class FakeChannel:
+    """
+    按脚本返回数据的通道
+
+    脚本中每一项依次作为一次 recv 的结果：bytes 原样返回（b'' 表示通道关闭），
+    异常实例会被抛出，可调用对象先执行再取其返回值。
+    """
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.timeouts = []
+        self.sent = []
+        self.closed = False
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+
+    def recv(self, size):
+        if not self.script:
+            raise socket.timeout()
+        item = self.script.pop(0)
+        if callable(item):
+            item = item()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def get_pty(self):
+        self.pty = True
+
+    def exec_command(self, command):
+        self.command = command
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    """open_session 依次返回预设的通道，超出时模拟 sshd 拒绝（MaxSessions）"""
+
+    def __init__(self, channels):
+        self.channels = list(channels)
+
+    def open_session(self):
+        if not self.channels:
+            raise EOFError("ChannelException: Administratively prohibited")
+        return self.channels.pop(0)
+
+
+class FakeParamikoClient:
+
+    def __init__(self, channels):
+        self.transport = FakeTransport(channels)
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        pass
+
+
+def read_lines(client, channel):
+    lines = []
+    client.read_ping_output(channel, lines.append)
+    return lines
+
+
+class BrokenChannel:
+    """关闭时抛出异常的通道"""
+
+    def close(self):
+        raise EOFError("socket closed")
+
+
+def make_client():
+    return SSHClient('10.0.0.1', 'root', 'x')
+
+
+class TestClose:
+
+    def test_returns_error_instead_of_printing(self, capsys):
+        client = make_client()
+        client.channels.append(BrokenChannel())
+
+        assert client.close() == "关闭连接失败: 10.0.0.1: socket closed"
+        assert capsys.readouterr().out == ""
+
+    def test_returns_none_on_success(self):
+        assert make_client().close() is None
+
+
+class TestReadPingOutput:
+
+    def test_splits_lines_across_chunks(self):
+        client = make_client()
+        channel = FakeChannel([
+            b"PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.\r\n64 bytes from 8.8.8.8: icmp_",
+            b"seq=1 ttl=117 time=20.1 ms\r\n\r\n",
+            b"no answer yet for icmp_seq=2\r\n",
+            b"",
+        ])
+
+        assert read_lines(client, channel) == [
+            "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.",
+            "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms",
+            "no answer yet for icmp_seq=2",
+        ]
+        assert channel.timeouts[0] == SSHClient.READ_TIMEOUT
+
+    def test_multibyte_character_split_between_chunks(self):
+        client = make_client()
+        text = "目标不可达\n".encode('utf-8')
+        channel = FakeChannel([text[:4], text[4:], b""])
+
+        assert read_lines(client, channel) == ["目标不可达"]
+
+    def test_idle_timeouts_keep_reading(self):
+        client = make_client()
+        channel = FakeChannel([socket.timeout(), socket.timeout(), b"line 1\n", b""])
+
+        assert read_lines(client, channel) == ["line 1"]
+
+    def test_drains_statistics_after_stop(self):
+        client = make_client()
+
+        def stop_then_idle():
+            client.stop_event.set()
+            return socket.timeout()
+
+        channel = FakeChannel([
+            b"64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms\n",
+            stop_then_idle,
+            b"^C\n--- 8.8.8.8 ping statistics ---\n",
+            b"1 packets transmitted, 1 received, 0% packet loss",
+            socket.timeout(),
+        ])
+
+        lines = read_lines(client, channel)
+
+        assert lines == [
+            "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=20.1 ms",
+            "^C",
+            "--- 8.8.8.8 ping statistics ---",
+            # 最后一行没有换行符，作为尾部内容输出
+            "1 packets transmitted, 1 received, 0% packet loss",
+        ]
+        assert channel.timeouts == [SSHClient.READ_TIMEOUT, SSHClient.DRAIN_TIMEOUT]
+
+    def test_drain_reads_at_most_ten_chunks(self):
+        client = make_client()
+        client.stop_event.set()
+        channel = FakeChannel([f"line {i}\n".encode() for i in range(20)])
+
+        assert read_lines(client, channel) == [f"line {i}" for i in range(10)]
+
+    def test_read_error_reported_to_callback(self):
+        client = make_client()
+        channel = FakeChannel([b"line 1\n", OSError("connection reset")])
+
+        assert read_lines(client, channel) == ["line 1", "执行 ping 命令出错: connection reset"]
+
+
+class TestPingChannel:
+
+    def test_runs_ping_with_pty_via_exec(self):
+        client = make_client()
+        channel = FakeChannel()
+        client.client = FakeParamikoClient([channel])
+
+        assert client.open_ping_channel('8.8.8.8') is channel
+        assert channel.pty
+        assert channel.command == "ping 8.8.8.8 -O"
+        assert client.channels == [channel]
+
+    def test_open_failure_raises(self):
+        client = make_client()
+        client.client = FakeParamikoClient([])
+
+        with pytest.raises(EOFError):
+            client.open_ping_channel('8.8.8.8')
+
+    def test_execute_ping_reports_open_failure(self):
+        client = make_client()
+        client.client = FakeParamikoClient([])
+        lines = []
+
+        client.execute_ping('8.8.8.8', lines.append)
+
+        assert lines == ["执行 ping 命令出错: ChannelException: Administratively prohibited"]
+
+    def test_stop_ping_interrupts_every_channel(self):
+        client = make_client()
+        first, second, closed = FakeChannel(), FakeChannel(), FakeChannel()
+        closed.closed = True
+        client.channels.extend([first, second, closed])
+
+        client.stop_ping()
+
+        assert client.stop_event.is_set()
+        assert first.sent == ['\x03']
+        assert second.sent == ['\x03']
+        assert closed.sent == []
+
+
+class RefusingParamikoClient:
+    """每次连接都失败的 paramiko.SSHClient"""
+
+    attempts = 0
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, **kwargs):
+        RefusingParamikoClient.attempts += 1
+        raise ConnectionRefusedError("connection refused")
+
+    def close(self):
+        pass
+
+
+class TestConnectStop:
+
+    @pytest.fixture(autouse=True)
+    def refusing(self, monkeypatch):
+        RefusingParamikoClient.attempts = 0
+        monkeypatch.setattr('ping_mesh.ssh_client.paramiko.SSHClient', RefusingParamikoClient)
+
+    def test_stop_before_connect_skips_attempts(self):
+        client = make_client()
+        client.stop_ping()
+
+        assert client.connect() is False
+        assert RefusingParamikoClient.attempts == 0
+        assert client.last_error == "测试已停止"
+
+    def test_stop_interrupts_backoff(self):
+        client = make_client()
+        threading.Timer(0.2, client.stop_ping).start()
+
+        started = time.monotonic()
+        assert client.connect() is False
+
+        # 第一次失败后进入 2 秒退避，stop_ping 立即唤醒且不再重试
+        assert time.monotonic() - started < 1.5
+        assert RefusingParamikoClient.attempts == 1
+        assert client.last_error == "测试已停止"